@@ -19,6 +19,7 @@ class Settings(BaseSettings):
     deepseek_base_url: str = "https://api.deepseek.com/v1"
     deepseek_model: str = "deepseek-chat"
     sync_inline: bool = False
+    sync_workers_per_source: int = 1
     max_history_pages: int = 200
     request_timeout: int = 20
     persist_cookie_on_disk: bool = True
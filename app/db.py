@@ -1,8 +1,10 @@
+import sqlite3
 from pathlib import Path
 from threading import Lock
-from typing import Generator
+from typing import Generator, Tuple
 
 from sqlalchemy import event
+from sqlalchemy.schema import CreateIndex
 from sqlmodel import Session, SQLModel, create_engine
 
 from app.config import get_settings
@@ -10,6 +12,9 @@ from app.config import get_settings
 _ENGINE = None
 _ENGINE_LOCK = Lock()
 
+# Sync upserts use INSERT ... ON CONFLICT ... RETURNING, added in SQLite 3.35.
+MIN_SQLITE_VERSION = (3, 35, 0)
+
 
 def _build_sqlite_url(db_path: str) -> str:
     return f"sqlite:///{db_path}"
@@ -28,6 +33,12 @@ def _create_engine():
     def _sqlite_pragmas(dbapi_connection, _):
         cursor = dbapi_connection.cursor()
         cursor.execute("PRAGMA journal_mode=WAL;")
+        # WAL makes NORMAL durable against app crashes; fsync happens at checkpoint instead of per commit.
+        cursor.execute("PRAGMA synchronous=NORMAL;")
+        cursor.execute("PRAGMA busy_timeout=5000;")
+        cursor.execute("PRAGMA temp_store=MEMORY;")
+        cursor.execute("PRAGMA mmap_size=268435456;")
+        cursor.execute("PRAGMA wal_autocheckpoint=1000;")
         cursor.execute("PRAGMA foreign_keys=ON;")
         cursor.close()
 
@@ -49,9 +60,25 @@ def reset_engine():
         return _ENGINE
 
 
+def check_sqlite_version(version_info: Tuple[int, ...] = sqlite3.sqlite_version_info) -> None:
+    if tuple(version_info) < MIN_SQLITE_VERSION:
+        found = ".".join(str(part) for part in version_info)
+        required = ".".join(str(part) for part in MIN_SQLITE_VERSION)
+        raise RuntimeError(
+            f"SQLite {required}+ is required (found {found}); upgrade the Python build's bundled sqlite3."
+        )
+
+
 def init_db() -> None:
+    check_sqlite_version()
     engine = get_engine()
     SQLModel.metadata.create_all(engine)
+    # create_all skips tables that already exist; add indexes introduced after a
+    # database was first created (there is no migration tool in this project).
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
 
 
 def get_session() -> Generator[Session, None, None]:
@@ -1,14 +1,21 @@
 from pathlib import Path
 
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse
 from fastapi.templating import Jinja2Templates
 
 from app.db import init_db
 from app.routers.recommend import router as recommend_router
 from app.routers.sync import router as sync_router
 
-app = FastAPI(title="WatchWhat Web", version="0.1.0")
+try:
+    import orjson  # type: ignore  # noqa: F401
+
+    DEFAULT_RESPONSE_CLASS = ORJSONResponse
+except ImportError:
+    DEFAULT_RESPONSE_CLASS = JSONResponse
+
+app = FastAPI(title="WatchWhat Web", version="0.1.0", default_response_class=DEFAULT_RESPONSE_CLASS)
 
 templates = Jinja2Templates(directory=str(Path(__file__).parent / "templates"))
 
@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import Optional
 from uuid import uuid4
 
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import Index, UniqueConstraint, text
 from sqlmodel import Field, SQLModel
 
 
@@ -12,7 +12,12 @@ def utcnow() -> datetime:
 
 class User(SQLModel, table=True):
     __tablename__ = "users"
-    __table_args__ = (UniqueConstraint("source", "username", name="uq_users_source_username"),)
+    __table_args__ = (
+        UniqueConstraint("source", "username", name="uq_users_source_username"),
+        # Backs the case-insensitive friend lookup (lower(username) IN ...), which the
+        # unique index above cannot serve.
+        Index("ix_users_source_lower_username", "source", text("lower(username)")),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     source: str = Field(default="douban", index=True)
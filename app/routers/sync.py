@@ -1,4 +1,6 @@
+from collections import Counter
 from datetime import datetime
+from typing import Optional
 
 from fastapi import APIRouter, HTTPException, Query
 from sqlmodel import Session, select
@@ -14,6 +16,8 @@ from app.schemas import (
     FriendsSyncResponse,
     LibraryItem,
     LibraryResponse,
+    SyncBatchRequest,
+    SyncBatchResponse,
     SyncRequest,
     SyncStartResponse,
     SyncStatusResponse,
@@ -104,15 +108,9 @@ def _load_local_friend_profiles(
     return profiles
 
 
-@router.post("/sync", response_model=SyncStartResponse)
-def start_sync(request: SyncRequest) -> SyncStartResponse:
-    if request.source != "douban":
-        raise HTTPException(status_code=400, detail="Only douban source is supported in v1")
-
-    if request.cookie:
-        cookie_capture_manager.set_cookie(request.source, request.cookie)
-    cookie = request.cookie or cookie_capture_manager.get_cookie(request.source)
-    normalized_username = normalize_douban_username(request.username)
+def _prepare_sync(source: str, username: str, cookie: Optional[str], sync_scope: str) -> tuple[str, list]:
+    """Validate one sync target and return its effective username and media types."""
+    normalized_username = normalize_douban_username(username)
     if normalized_username == "__mine__" and not cookie:
         raise HTTPException(
             status_code=400,
@@ -124,12 +122,23 @@ def start_sync(request: SyncRequest) -> SyncStartResponse:
             detail="Invalid Douban username. Please provide a username or profile URL with /people/<username>/.",
         )
     effective_username = _resolve_username_from_cookie(
-        source=request.source,
+        source=source,
         normalized_username=normalized_username,
         cookie=cookie or "",
     )
+    media_types = _resolve_sync_media_types(sync_scope, username, normalized_username)
+    return effective_username, media_types
 
-    media_types = _resolve_sync_media_types(request.sync_scope, request.username, normalized_username)
+
+@router.post("/sync", response_model=SyncStartResponse)
+def start_sync(request: SyncRequest) -> SyncStartResponse:
+    if request.source != "douban":
+        raise HTTPException(status_code=400, detail="Only douban source is supported in v1")
+
+    if request.cookie:
+        cookie_capture_manager.set_cookie(request.source, request.cookie)
+    cookie = request.cookie or cookie_capture_manager.get_cookie(request.source)
+    effective_username, media_types = _prepare_sync(request.source, request.username, cookie, request.sync_scope)
     job_id = sync_job_runner.start_sync(
         source=request.source,
         username=effective_username,
@@ -140,6 +149,29 @@ def start_sync(request: SyncRequest) -> SyncStartResponse:
     return SyncStartResponse(job_id=job_id, status="queued")
 
 
+@router.post("/sync/batch", response_model=SyncBatchResponse)
+def start_sync_batch(request: SyncBatchRequest) -> SyncBatchResponse:
+    if request.source != "douban":
+        raise HTTPException(status_code=400, detail="Only douban source is supported in v1")
+
+    if request.cookie:
+        cookie_capture_manager.set_cookie(request.source, request.cookie)
+    cookie = request.cookie or cookie_capture_manager.get_cookie(request.source)
+    # Validate every username before queueing anything so a bad entry does not leave a partial batch.
+    targets = [_prepare_sync(request.source, username, cookie, request.sync_scope) for username in request.usernames]
+    job_ids = [
+        sync_job_runner.start_sync(
+            source=request.source,
+            username=effective_username,
+            cookie=cookie,
+            force_full=request.force_full,
+            media_types=media_types,
+        )
+        for effective_username, media_types in targets
+    ]
+    return SyncBatchResponse(job_ids=job_ids, status="queued")
+
+
 @router.post("/friends/sync", response_model=FriendsSyncResponse)
 def sync_friends(request: FriendsSyncRequest) -> FriendsSyncResponse:
     if request.source != "douban":
@@ -366,8 +398,9 @@ def get_library(
         ),
         reverse=True,
     )
-    movie_tv_count = sum(1 for _, item in ordered if item.type in {"movie", "tv"})
-    book_count = sum(1 for _, item in ordered if item.type == "book")
+    type_counts = Counter(item.type for _, item in ordered)
+    movie_tv_count = type_counts["movie"] + type_counts["tv"]
+    book_count = type_counts["book"]
     sliced = ordered[offset : offset + limit]
 
     return LibraryResponse(
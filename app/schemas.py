@@ -17,6 +17,19 @@ class SyncStartResponse(BaseModel):
     status: str
 
 
+class SyncBatchRequest(BaseModel):
+    source: str = "douban"
+    usernames: List[str] = Field(min_length=1, max_length=50)
+    cookie: Optional[str] = None
+    force_full: bool = False
+    sync_scope: Literal["auto", "book", "movie_tv", "all"] = "auto"
+
+
+class SyncBatchResponse(BaseModel):
+    job_ids: List[str]
+    status: str
+
+
 class SyncCountSnapshot(BaseModel):
     movie_tv: int = 0
     book: int = 0
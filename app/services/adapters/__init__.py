@@ -1,7 +1,12 @@
+from functools import lru_cache
+
 from app.services.adapters.base import SourceAdapter
 
 
+@lru_cache(maxsize=8)
 def get_source_adapter(source: str) -> SourceAdapter:
+    # Adapters are shared across jobs so their pooled HTTP client and per-host
+    # throttle persist; they only read settings at construction time.
     if source != "douban":
         raise ValueError(f"Unsupported source: {source}")
     from app.services.adapters.douban import DoubanAdapter
@@ -24,6 +24,18 @@ class HistoryPage:
     next_cursor: Optional[int]
 
 
+@dataclass
+class CandidateMeta:
+    friend_count: int = 0
+    friend_avg_rating: float = 0.0
+    friend_users: str = ""
+    friend_weight_sum: float = 0.0
+    friend_weight_avg: float = 1.0
+    friend_latest_ts: float = 0.0
+    friend_latest_date: str = ""
+    friend_comment_chars: int = 0
+
+
 @dataclass
 class CandidateItem:
     subject_id: str
@@ -33,6 +45,8 @@ class CandidateItem:
     douban_url: str
     score: float = 0.0
     metadata: Dict[str, str] = field(default_factory=dict)
+    # Numeric friend signals kept alongside the string metadata so ranking skips re-parsing.
+    typed_meta: Optional[CandidateMeta] = None
 
 
 class SourceAdapter(ABC):
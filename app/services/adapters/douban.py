@@ -1,11 +1,14 @@
 import logging
 import re
 import subprocess
+import threading
 import time
+from collections import OrderedDict
 from html import unescape
 from typing import List, Optional, Sequence
 from urllib.parse import urlencode
 from urllib.parse import urljoin
+from urllib.parse import urlsplit
 
 import httpx
 
@@ -22,6 +25,13 @@ _REALISTIC_UA = (
     "Chrome/131.0.0.0 Safari/537.36"
 )
 
+# The adapter is shared across jobs and fetches movie/book hosts concurrently; keep a
+# few warm connections per host instead of re-handshaking TLS for every page.
+_CLIENT_LIMITS = httpx.Limits(max_connections=8, max_keepalive_connections=4, keepalive_expiry=30.0)
+
+# Resolved dbcl2 uid -> canonical username, kept per adapter (and so per process).
+_COOKIE_USERNAME_CACHE_SIZE = 256
+
 _ANTI_BOT_MARKERS = [
     "sec.douban.com",
     "/misc/sorry",
@@ -88,10 +98,16 @@ class DoubanAdapter(SourceAdapter):
     def __init__(self, client: Optional[httpx.Client] = None):
         self.settings = get_settings()
         self._page_delay = 1.5
-        self._last_request_time = 0.0
-        self._cookie_username_cache: dict[str, Optional[str]] = {}
+        # Throttle per host so movie/book pages can be fetched concurrently without
+        # either host seeing requests closer together than _page_delay.
+        self._throttle_lock = threading.Lock()
+        self._last_request_time: dict[str, float] = {}
+        self._cookie_username_lock = threading.Lock()
+        self._cookie_username_cache: "OrderedDict[str, str]" = OrderedDict()
         self.client = client or httpx.Client(
             timeout=self.settings.request_timeout,
+            # No custom transport: passing one makes httpx skip HTTP(S)_PROXY/ALL_PROXY from the env.
+            limits=_CLIENT_LIMITS,
             headers={
                 "User-Agent": _REALISTIC_UA,
                 "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
@@ -110,13 +126,19 @@ class DoubanAdapter(SourceAdapter):
         return {"Cookie": normalized}
 
     def _throttled_get(self, url: str, **kwargs) -> httpx.Response:
-        now = time.monotonic()
-        elapsed = now - self._last_request_time
-        if elapsed < self._page_delay:
-            time.sleep(self._page_delay - elapsed)
-        response = self.client.get(url, **kwargs)
-        self._last_request_time = time.monotonic()
-        return response
+        host = urlsplit(url).netloc
+        with self._throttle_lock:
+            now = time.monotonic()
+            wait = max(0.0, self._last_request_time.get(host, 0.0) + self._page_delay - now)
+            # Reserve the slot before sleeping so a concurrent caller queues behind it.
+            self._last_request_time[host] = now + wait
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            return self.client.get(url, **kwargs)
+        finally:
+            with self._throttle_lock:
+                self._last_request_time[host] = max(self._last_request_time.get(host, 0.0), time.monotonic())
 
     def _detect_is_own_account(self, username: str, cookie: Optional[str]) -> bool:
         if not cookie or username == "__mine__":
@@ -599,20 +621,28 @@ class DoubanAdapter(SourceAdapter):
     _DBCL2_RE = re.compile(r'dbcl2="?(\d+):')
 
     def _detect_cookie_username(self, cookie: str) -> Optional[str]:
-        cache_key = normalize_cookie_text(cookie or "")[:64]
-        if cache_key in self._cookie_username_cache:
-            return self._cookie_username_cache[cache_key]
-
-        uid = self._extract_dbcl2_uid(cookie)
-        if uid:
-            canonical = self._resolve_canonical_username(uid, cookie)
-            result = canonical or uid
-            logger.info("Detected cookie username from dbcl2: %s (uid=%s)", result, uid)
-            self._cookie_username_cache[cache_key] = result
-            return result
-
-        self._cookie_username_cache[cache_key] = None
-        return None
+        uid = self._extract_dbcl2_uid(cookie or "")
+        if not uid:
+            return None
+
+        with self._cookie_username_lock:
+            cached = self._cookie_username_cache.get(uid)
+            if cached is not None:
+                self._cookie_username_cache.move_to_end(uid)
+                return cached
+
+        canonical = self._resolve_canonical_username(uid, cookie)
+        logger.info("Detected cookie username from dbcl2: %s (uid=%s)", canonical or uid, uid)
+        if canonical is None:
+            # Resolution can fail transiently; fall back to the uid without caching it.
+            return uid
+
+        with self._cookie_username_lock:
+            self._cookie_username_cache[uid] = canonical
+            self._cookie_username_cache.move_to_end(uid)
+            while len(self._cookie_username_cache) > _COOKIE_USERNAME_CACHE_SIZE:
+                self._cookie_username_cache.popitem(last=False)
+        return canonical
 
     def _extract_dbcl2_uid(self, cookie: str) -> Optional[str]:
         match = self._DBCL2_RE.search(cookie)
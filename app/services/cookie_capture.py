@@ -1,4 +1,6 @@
 import json
+import os
+import tempfile
 import threading
 import time
 from dataclasses import dataclass
@@ -8,7 +10,7 @@ from uuid import uuid4
 
 from app.config import get_settings
 
-COOKIE_ATTR_NAMES = {
+COOKIE_ATTR_NAMES = frozenset({
     "path",
     "domain",
     "expires",
@@ -18,7 +20,7 @@ COOKIE_ATTR_NAMES = {
     "samesite",
     "priority",
     "partitioned",
-}
+})
 
 
 def normalize_cookie_text(cookie: str) -> str:
@@ -43,14 +45,16 @@ def normalize_cookie_text(cookie: str) -> str:
 
 
 def extract_cookie_text(cookies: Iterable[dict]) -> str:
-    pairs = []
+    # One pass into an insertion-ordered jar (latest value wins) instead of joining
+    # the pairs and re-splitting them through normalize_cookie_text.
+    jar: Dict[str, str] = {}
     for cookie in cookies:
         name = str(cookie.get("name", "")).strip()
         value = str(cookie.get("value", "")).strip()
-        if not name or not value:
+        if not name or not value or name.lower() in COOKIE_ATTR_NAMES:
             continue
-        pairs.append(f"{name}={value}")
-    return normalize_cookie_text("; ".join(pairs))
+        jar[name] = value
+    return "; ".join(f"{name}={value}" for name, value in jar.items())
 
 
 def has_login_cookie(cookie_names: Iterable[str]) -> bool:
@@ -87,6 +91,9 @@ class CookieCaptureManager:
         if not normalized:
             return
         with self._lock:
+            # Auto-capture re-submits the same cookie repeatedly; only changes hit the disk.
+            if self._cookies.get(source) == normalized:
+                return
             self._cookies[source] = normalized
             snapshot = dict(self._cookies)
         self._persist_cookies(snapshot)
@@ -242,14 +249,29 @@ class CookieCaptureManager:
     def _persist_cookies(self, cookies: Dict[str, str]) -> None:
         if not self._persist_enabled:
             return
+        tmp_path: Optional[str] = None
         try:
             self._persist_path.parent.mkdir(parents=True, exist_ok=True)
-            self._persist_path.write_text(
-                json.dumps(cookies, ensure_ascii=False, indent=2),
+            # Write a sibling temp file and swap it in so readers never see a partial store.
+            with tempfile.NamedTemporaryFile(
+                "w",
                 encoding="utf-8",
-            )
+                dir=self._persist_path.parent,
+                prefix=f".{self._persist_path.name}.",
+                delete=False,
+            ) as handle:
+                tmp_path = handle.name
+                handle.write(json.dumps(cookies, ensure_ascii=False, indent=2))
+            os.replace(tmp_path, self._persist_path)
+            tmp_path = None
         except Exception:
             return
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
 
 
 cookie_capture_manager = CookieCaptureManager()
@@ -7,6 +7,14 @@ from bs4 import BeautifulSoup
 
 from app.services.adapters.base import CandidateItem, HistoryPage, HistoryRecord
 
+try:
+    import lxml  # type: ignore  # noqa: F401
+
+    # lxml's C parser is several times faster than html.parser on full collection pages.
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
 SUBJECT_RE = re.compile(r"/subject/(\d+)/")
 RATING_RE = re.compile(r"rating([1-5])-t")
 YEAR_RE = re.compile(r"(19\d{2}|20\d{2})")
@@ -24,12 +32,14 @@ def _parse_subject_id(url: str) -> Optional[str]:
 
 
 def _parse_rating(node) -> Optional[float]:
-    for span in node.select("span"):
-        classes = span.get("class", [])
-        for class_name in classes:
-            rating_match = RATING_RE.search(class_name)
-            if rating_match:
-                return float(int(rating_match.group(1)) * 2)
+    # bs4 matches class_ regexes against each class name, so only the rating span is visited in Python.
+    span = node.find("span", class_=RATING_RE)
+    if span is None:
+        return None
+    for class_name in span.get("class", []):
+        rating_match = RATING_RE.search(class_name)
+        if rating_match:
+            return float(int(rating_match.group(1)) * 2)
     return None
 
 
@@ -163,7 +173,7 @@ def _detect_next_cursor(soup: BeautifulSoup, current_cursor: int) -> Optional[in
 
 
 def parse_history_page(html: str, media_type: str, current_cursor: int = 0) -> HistoryPage:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, HTML_PARSER)
     records: List[HistoryRecord] = []
 
     for item in soup.select("li.item, li.subject-item"):
@@ -183,7 +193,9 @@ def parse_history_page(html: str, media_type: str, current_cursor: int = 0) -> H
 
         date_node = item.select_one("span.date")
         date_text = date_node.get_text(strip=True) if date_node else ""
-        date_text = DATE_RE.search(date_text).group(1) if DATE_RE.search(date_text) else date_text
+        date_match = DATE_RE.search(date_text)
+        if date_match:
+            date_text = date_match.group(1)
         interacted_at = _parse_date(date_text)
 
         comment_node = item.select_one("span.comment, p.comment")
@@ -227,7 +239,7 @@ def parse_history_page(html: str, media_type: str, current_cursor: int = 0) -> H
 
 
 def parse_subject_candidates(html: str, default_type: str) -> List[CandidateItem]:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, HTML_PARSER)
     results: List[CandidateItem] = []
     seen = set()
 
@@ -263,7 +275,7 @@ def parse_subject_candidates(html: str, default_type: str) -> List[CandidateItem
 
 
 def parse_top250_page(html: str, default_type: str) -> List[CandidateItem]:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, HTML_PARSER)
     results: List[CandidateItem] = []
 
     for item in soup.select("li .title"):
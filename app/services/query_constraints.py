@@ -11,6 +11,25 @@ class QueryConstraints:
     friend_focus: bool = False
 
 
+@dataclass(frozen=True)
+class QueryHints:
+    movie: bool = False
+    tv: bool = False
+    book: bool = False
+    recent: bool = False
+
+    @classmethod
+    def from_query(cls, query: str) -> "QueryHints":
+        # "剧" already covers "电视剧" and "近" covers "最近".
+        text = query or ""
+        return cls(
+            movie="电影" in text,
+            tv="剧" in text,
+            book="书" in text or "阅读" in text,
+            recent="近" in text,
+        )
+
+
 BOOK_KEYWORDS = ("小说", "书籍", "看书", "书", "阅读", "读书", "漫画")
 TOPIC_KEYWORDS = {
     "mystery": ("推理", "悬疑", "侦探", "探案", "本格"),
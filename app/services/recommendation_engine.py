@@ -1,7 +1,10 @@
 import json
 import math
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Optional, Sequence, Set, Tuple
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
 
 from sqlalchemy import func
 from sqlmodel import Session, select
@@ -10,13 +13,13 @@ from app.db import get_engine
 from app.models import Interaction, Item, RecommendSession, User
 from app.schemas import AppliedConstraints, RecommendResponse, RecommendationItem
 from app.services import adapters
-from app.services.adapters.base import CandidateItem
+from app.services.adapters.base import CandidateItem, CandidateMeta
 from app.services.douban_username import normalize_douban_username
 from app.services.llm_deepseek import DeepSeekClient
-from app.services.query_constraints import QueryConstraints, parse_query_constraints
+from app.services.query_constraints import QueryConstraints, QueryHints, parse_query_constraints
 from app.services.series_normalizer import build_series_identity
 
-FALLBACK_CANDIDATE_CATALOG = [
+_FALLBACK_CATALOG_ROWS = [
     {
         "subject_id": "fallback-movie-parasite",
         "title": "Parasite",
@@ -150,6 +153,68 @@ FALLBACK_CANDIDATE_CATALOG = [
 ]
 
 
+@dataclass(frozen=True)
+class FallbackCatalog:
+    """Catalog rows plus positional indexes by type and tag, so filtering intersects indexes instead of scanning."""
+
+    rows: Tuple[Mapping[str, Any], ...]
+    by_type: Mapping[str, FrozenSet[int]]
+    by_tag: Mapping[str, FrozenSet[int]]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Mapping[str, Any]]) -> "FallbackCatalog":
+        rows = tuple(rows)
+        by_type: Dict[str, Set[int]] = {}
+        by_tag: Dict[str, Set[int]] = {}
+        for position, row in enumerate(rows):
+            by_type.setdefault(row["type"], set()).add(position)
+            for tag in row.get("tags", ()):
+                by_tag.setdefault(tag, set()).add(position)
+        return cls(
+            rows=rows,
+            by_type={key: frozenset(value) for key, value in by_type.items()},
+            by_tag={key: frozenset(value) for key, value in by_tag.items()},
+        )
+
+    def positions(self, types: Set[str], topic_tags: Set[str]) -> List[int]:
+        """Row positions, in catalog order, whose type is in ``types`` and that share a tag with ``topic_tags``.
+
+        An empty ``types`` or ``topic_tags`` leaves that dimension unfiltered.
+        """
+        type_hits = set().union(*(self.by_type.get(item_type, ()) for item_type in types)) if types else None
+        tag_hits = set().union(*(self.by_tag.get(tag, ()) for tag in topic_tags)) if topic_tags else None
+        if type_hits is None and tag_hits is None:
+            return list(range(len(self.rows)))
+        if type_hits is None:
+            return sorted(tag_hits)
+        if tag_hits is None:
+            return sorted(type_hits)
+        return sorted(type_hits & tag_hits)
+
+
+FALLBACK_CANDIDATE_CATALOG = FallbackCatalog.from_rows(_FALLBACK_CATALOG_ROWS)
+
+_FALLBACK_CATALOG_OVERRIDE: ContextVar[Optional[FallbackCatalog]] = ContextVar(
+    "fallback_catalog_override", default=None
+)
+
+
+@contextmanager
+def override_fallback_catalog(rows: Iterable[Mapping[str, Any]]) -> Iterator[FallbackCatalog]:
+    """Serve the fallback catalog from ``rows`` within the current context only."""
+    catalog = FallbackCatalog.from_rows(rows)
+    token = _FALLBACK_CATALOG_OVERRIDE.set(catalog)
+    try:
+        yield catalog
+    finally:
+        _FALLBACK_CATALOG_OVERRIDE.reset(token)
+
+
+def get_fallback_catalog() -> FallbackCatalog:
+    override = _FALLBACK_CATALOG_OVERRIDE.get()
+    return override if override is not None else FALLBACK_CANDIDATE_CATALOG
+
+
 class RecommendationEngine:
     def __init__(self):
         self.llm_client = DeepSeekClient()
@@ -165,6 +230,7 @@ class RecommendationEngine:
         friend_weights: Optional[Dict[str, float]] = None,
     ) -> RecommendResponse:
         constraints = parse_query_constraints(query)
+        hints = QueryHints.from_query(query)
         normalized_friend_usernames = self._normalize_friend_usernames(friend_usernames, username)
         normalized_friend_weights = self._normalize_friend_weights(
             friend_usernames=normalized_friend_usernames,
@@ -230,7 +296,7 @@ class RecommendationEngine:
             using_fallback_catalog = False
             if not candidates:
                 fallback_candidates = self._fallback_candidates(
-                    query=query,
+                    hints=hints,
                     history=history,
                     seen_subject_ids=seen_subject_ids,
                     constraints=constraints,
@@ -296,6 +362,7 @@ class RecommendationEngine:
 
             ranking = self._rank_candidates(
                 query=query,
+                hints=hints,
                 profile_summary=profile_summary,
                 candidates=candidates,
                 allow_followup=allow_followup,
@@ -535,6 +602,8 @@ class RecommendationEngine:
                 recency_boost = max(0.0, 1.0 - min(days_since, 3650.0) / 3650.0) * 0.05
 
             score = min(0.99, 0.38 + 0.40 * (avg_rating / 10.0) + 0.17 * social_boost + comment_boost + recency_boost)
+            friend_users = ",".join(sorted(usernames)[:5])
+            latest_date = latest_interacted_at.isoformat() if latest_interacted_at else ""
 
             candidates.append(
                 CandidateItem(
@@ -547,13 +616,23 @@ class RecommendationEngine:
                     metadata={
                         "friend_count": str(friend_count),
                         "friend_avg_rating": f"{avg_rating:.2f}",
-                        "friend_users": ",".join(sorted(usernames)[:5]),
+                        "friend_users": friend_users,
                         "friend_weight_sum": f"{weight_sum:.3f}",
                         "friend_weight_avg": f"{(weight_sum / friend_count):.3f}",
                         "friend_latest_ts": f"{latest_ts:.3f}",
-                        "friend_latest_date": latest_interacted_at.isoformat() if latest_interacted_at else "",
+                        "friend_latest_date": latest_date,
                         "friend_comment_chars": str(comment_chars),
                     },
+                    typed_meta=CandidateMeta(
+                        friend_count=friend_count,
+                        friend_avg_rating=round(avg_rating, 2),
+                        friend_users=friend_users,
+                        friend_weight_sum=round(weight_sum, 3),
+                        friend_weight_avg=round(weight_sum / friend_count, 3),
+                        friend_latest_ts=round(latest_ts, 3),
+                        friend_latest_date=latest_date,
+                        friend_comment_chars=comment_chars,
+                    ),
                 )
             )
 
@@ -695,6 +774,7 @@ class RecommendationEngine:
                     douban_url=candidate.douban_url,
                     score=candidate.score,
                     metadata=metadata,
+                    typed_meta=candidate.typed_meta,
                 )
             )
         return annotated
@@ -792,6 +872,7 @@ class RecommendationEngine:
     def _rank_candidates(
         self,
         query: str,
+        hints: QueryHints,
         profile_summary: str,
         candidates: List[CandidateItem],
         allow_followup: bool,
@@ -815,8 +896,8 @@ class RecommendationEngine:
         if llm_ranked is not None and llm_ranked.ranked:
             candidate_map = {candidate.subject_id: candidate for candidate in candidates}
             ranked_items: List[RecommendationItem] = []
-            used_subjects: Set[str] = set()
-            used_series: Set[str] = set()
+            # Series keys are always "<type>:..." so they never collide with subject ids.
+            used: Set[str] = set()
 
             for choice in llm_ranked.ranked:
                 candidate = candidate_map.get(choice.subject_id)
@@ -824,25 +905,19 @@ class RecommendationEngine:
                     continue
                 if constraints.strict_types and candidate.type not in constraints.strict_types:
                     continue
-                if candidate.subject_id in used_subjects:
-                    continue
-                series_key = self._candidate_series_key(candidate)
-                if series_key in used_series:
+                keys = (candidate.subject_id, self._candidate_series_key(candidate))
+                if not used.isdisjoint(keys):
                     continue
-                used_subjects.add(candidate.subject_id)
-                used_series.add(series_key)
+                used.update(keys)
                 ranked_items.append(self._candidate_to_response(candidate, score=float(choice.score), reason=choice.reason))
 
             for candidate in candidates:
                 if constraints.strict_types and candidate.type not in constraints.strict_types:
                     continue
-                if candidate.subject_id in used_subjects:
+                keys = (candidate.subject_id, self._candidate_series_key(candidate))
+                if not used.isdisjoint(keys):
                     continue
-                series_key = self._candidate_series_key(candidate)
-                if series_key in used_series:
-                    continue
-                used_subjects.add(candidate.subject_id)
-                used_series.add(series_key)
+                used.update(keys)
                 ranked_items.append(
                     self._candidate_to_response(
                         candidate,
@@ -853,10 +928,7 @@ class RecommendationEngine:
             return ranked_items
 
         now_year = datetime.utcnow().year
-        movie_hint = "电影" in query
-        tv_hint = "剧" in query or "电视剧" in query
-        book_hint = "书" in query or "阅读" in query
-        recent_hint = "近" in query or "最近" in query
+        recent_hint = hints.recent
 
         scored = []
         for candidate in candidates:
@@ -865,11 +937,11 @@ class RecommendationEngine:
             score = candidate.score
             if recent_hint and candidate.year and candidate.year >= now_year - 5:
                 score += 0.25
-            if movie_hint and candidate.type == "movie":
+            if hints.movie and candidate.type == "movie":
                 score += 0.2
-            if tv_hint and candidate.type == "tv":
+            if hints.tv and candidate.type == "tv":
                 score += 0.2
-            if book_hint and candidate.type == "book":
+            if hints.book and candidate.type == "book":
                 score += 0.2
             scored.append((score, candidate))
 
@@ -889,16 +961,19 @@ class RecommendationEngine:
             if series_key in used_series:
                 continue
             used_series.add(series_key)
-            reason_parts = [self._friend_reason(candidate) or "匹配你的历史高分偏好"]
+            base_reason = self._friend_reason(candidate) or "匹配你的历史高分偏好"
             if candidate.year:
-                reason_parts.append(f"年份 {candidate.year}")
-            if recent_hint and candidate.year and candidate.year >= now_year - 5:
-                reason_parts.append("符合近年偏好")
+                if recent_hint and candidate.year >= now_year - 5:
+                    reason = f"{base_reason}，年份 {candidate.year}，符合近年偏好"
+                else:
+                    reason = f"{base_reason}，年份 {candidate.year}"
+            else:
+                reason = base_reason
             result.append(
                 self._candidate_to_response(
                     candidate,
                     score=round(float(score), 4),
-                    reason="，".join(reason_parts),
+                    reason=reason,
                 )
             )
         return result
@@ -928,8 +1003,7 @@ class RecommendationEngine:
         return validated
 
     def _candidate_to_response(self, candidate: CandidateItem, score: float, reason: str) -> RecommendationItem:
-        series_key = self._candidate_series_key(candidate)
-        series_title_zh = self._candidate_series_title(candidate)
+        series_key, series_title_zh = self._candidate_series_fields(candidate)
         return RecommendationItem(
             subject_id=candidate.subject_id,
             title=candidate.title,
@@ -949,35 +1023,49 @@ class RecommendationEngine:
             return value
         return build_series_identity(candidate.title, candidate.type).series_key
 
-    def _candidate_series_title(self, candidate: CandidateItem) -> str:
-        value = (candidate.metadata or {}).get("series_title_zh")
-        if value:
-            return value
-        return build_series_identity(candidate.title, candidate.type).series_display_title_zh
+    def _candidate_series_fields(self, candidate: CandidateItem) -> Tuple[str, str]:
+        metadata = candidate.metadata or {}
+        series_key = metadata.get("series_key")
+        series_title_zh = metadata.get("series_title_zh")
+        if series_key and series_title_zh:
+            return series_key, series_title_zh
+        identity = build_series_identity(candidate.title, candidate.type)
+        return series_key or identity.series_key, series_title_zh or identity.series_display_title_zh
 
     def _friend_reason(self, candidate: CandidateItem) -> Optional[str]:
-        metadata = candidate.metadata or {}
-        try:
-            friend_count = int(str(metadata.get("friend_count", "0")) or "0")
-        except ValueError:
-            friend_count = 0
-        if friend_count <= 0:
-            return None
+        typed_meta = candidate.typed_meta
+        if typed_meta is not None:
+            friend_count = typed_meta.friend_count
+            if friend_count <= 0:
+                return None
+            avg_rating = typed_meta.friend_avg_rating
+            weight_sum = typed_meta.friend_weight_sum
+            weight_avg = typed_meta.friend_weight_avg
+            friend_names = typed_meta.friend_users.strip()
+            latest_date = typed_meta.friend_latest_date.strip()
+        else:
+            metadata = candidate.metadata or {}
+            try:
+                friend_count = int(str(metadata.get("friend_count", "0")) or "0")
+            except ValueError:
+                friend_count = 0
+            if friend_count <= 0:
+                return None
 
-        try:
-            avg_rating = float(str(metadata.get("friend_avg_rating", "0")) or "0")
-        except ValueError:
-            avg_rating = 0.0
-        try:
-            weight_sum = float(str(metadata.get("friend_weight_sum", "0")) or "0")
-        except ValueError:
-            weight_sum = 0.0
-        try:
-            weight_avg = float(str(metadata.get("friend_weight_avg", "1")) or "1")
-        except ValueError:
-            weight_avg = 1.0
-        friend_names = str(metadata.get("friend_users", "")).strip()
-        latest_date = str(metadata.get("friend_latest_date", "")).strip()
+            try:
+                avg_rating = float(str(metadata.get("friend_avg_rating", "0")) or "0")
+            except ValueError:
+                avg_rating = 0.0
+            try:
+                weight_sum = float(str(metadata.get("friend_weight_sum", "0")) or "0")
+            except ValueError:
+                weight_sum = 0.0
+            try:
+                weight_avg = float(str(metadata.get("friend_weight_avg", "1")) or "1")
+            except ValueError:
+                weight_avg = 1.0
+            friend_names = str(metadata.get("friend_users", "")).strip()
+            latest_date = str(metadata.get("friend_latest_date", "")).strip()
         date_hint = latest_date[:10] if len(latest_date) >= 10 else ""
         weighted_hint = abs(weight_avg - 1.0) > 1e-6
         if friend_count == 1 and friend_names:
@@ -996,6 +1084,8 @@ class RecommendationEngine:
         return f"{parts[0]}（{'，'.join(parts[1:])}）"
 
     def _candidate_friend_latest_ts(self, candidate: CandidateItem) -> float:
+        if candidate.typed_meta is not None:
+            return candidate.typed_meta.friend_latest_ts
         metadata = candidate.metadata or {}
         value = metadata.get("friend_latest_ts")
         if value is None:
@@ -1010,44 +1100,36 @@ class RecommendationEngine:
 
     def _fallback_candidates(
         self,
-        query: str,
+        hints: QueryHints,
         history: Sequence[Tuple[Interaction, Item]],
         seen_subject_ids: Set[str],
         constraints: QueryConstraints,
     ) -> List[CandidateItem]:
         seen_titles = {item.title.strip().lower() for _, item in history if item.title}
         now_year = datetime.utcnow().year
-        movie_hint = "电影" in query
-        tv_hint = "剧" in query or "电视剧" in query
-        book_hint = "书" in query or "阅读" in query
-        recent_hint = "近" in query or "最近" in query
 
         rows = []
-        require_topic_match = bool(constraints.topic_tags)
-        for entry in FALLBACK_CANDIDATE_CATALOG:
+        catalog = get_fallback_catalog()
+        for position in catalog.positions(constraints.strict_types, constraints.topic_tags):
+            entry = catalog.rows[position]
             subject_id = entry["subject_id"]
             title = entry["title"]
             item_type = entry["type"]
             year = entry.get("year")
-            tags = set(entry.get("tags", []))
 
-            if constraints.strict_types and item_type not in constraints.strict_types:
-                continue
-            if require_topic_match and not (constraints.topic_tags & tags):
-                continue
             if subject_id in seen_subject_ids:
                 continue
             if title.strip().lower() in seen_titles:
                 continue
 
             score = float(entry["score"])
-            if recent_hint and year and year >= now_year - 5:
+            if hints.recent and year and year >= now_year - 5:
                 score += 0.2
-            if movie_hint and item_type == "movie":
+            if hints.movie and item_type == "movie":
                 score += 0.15
-            if tv_hint and item_type == "tv":
+            if hints.tv and item_type == "tv":
                 score += 0.15
-            if book_hint and item_type == "book":
+            if hints.book and item_type == "book":
                 score += 0.15
 
             rows.append((score, entry))
@@ -75,6 +75,8 @@ _OPENCC_T2S = OpenCC("t2s") if OpenCC is not None else None
 
 def _normalize_script(value: str) -> str:
     text = value or ""
+    if text.isascii():
+        return text
     if _OPENCC_T2S is not None:
         try:
             return _OPENCC_T2S.convert(text)
@@ -90,7 +92,14 @@ def _normalize_text(value: str) -> str:
 
 
 def _compact_key(value: str) -> str:
-    normalized = _normalize_script(_normalize_text(value)).lower()
+    text = value or ""
+    if text.isascii():
+        # NFKC and T2S are no-ops on ASCII, so only case and punctuation need folding.
+        if text.isalnum():
+            return text.lower()
+        normalized = text.lower()
+    else:
+        normalized = _normalize_script(_normalize_text(text)).lower()
     normalized = re.sub(r"[`'\"“”‘’·・･,，.。:：;；!?！？()\[\]{}<>《》【】/\\|+*&^%$#@~\-]+", " ", normalized)
     normalized = re.sub(r"\s+", "", normalized)
     return normalized
@@ -119,14 +128,19 @@ _SUFFIX_PATTERNS = [
     r"[\s:：\-–—]+\d{1,3}$",
 ]
 
+# One anchored alternation so each strip pass scans the title once instead of once per pattern.
+_SUFFIX_UNION = re.compile(
+    "(?:" + "|".join(f"(?:{pattern.rstrip('$')})" for pattern in _SUFFIX_PATTERNS) + ")$",
+    re.IGNORECASE,
+)
+
 
 def _strip_series_suffix(title: str) -> Tuple[str, bool]:
     current = _normalize_text(title)
     changed = False
     for _ in range(3):
         previous = current
-        for pattern in _SUFFIX_PATTERNS:
-            current = re.sub(pattern, "", current, flags=re.IGNORECASE)
+        current = _SUFFIX_UNION.sub("", current)
         current = current.strip(" -_:：·.").strip()
         if current == previous:
             break
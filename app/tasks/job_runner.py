@@ -1,23 +1,76 @@
+import atexit
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from threading import Lock
-from typing import Dict, List, Optional
+from queue import Queue
+from threading import Event, Lock
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
+from sqlalchemy import func, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlmodel import Session, select
 
 from app.config import get_settings
 from app.db import get_engine
 from app.models import Interaction, Item, SyncJob, User
 from app.services.adapters import get_source_adapter
-from app.services.adapters.base import HistoryRecord
+from app.services.adapters.base import HistoryPage, HistoryRecord, SourceAdapter
+
+_MOVIE_TV_TYPES = frozenset(("movie", "tv"))
+_ADDED_PREVIEW_LIMIT = 20
+
+# Built once and executed with a parameter list (executemany), so the compiled form
+# is cached instead of recompiling a differently sized multi-VALUES insert per page.
+_item_insert = sqlite_insert(Item)
+_ITEM_UPSERT = _item_insert.on_conflict_do_update(
+    index_elements=["source", "subject_id"],
+    set_={
+        "type": _item_insert.excluded.type,
+        "title": _item_insert.excluded.title,
+        "year": _item_insert.excluded.year,
+        "douban_url": _item_insert.excluded.douban_url,
+        "updated_at": _item_insert.excluded.updated_at,
+    },
+).returning(Item.id, Item.subject_id)
+
+_interaction_insert = sqlite_insert(Interaction)
+_INTERACTION_UPSERT = _interaction_insert.on_conflict_do_update(
+    index_elements=["user_id", "item_id"],
+    set_={
+        "rating": _interaction_insert.excluded.rating,
+        "interacted_at": _interaction_insert.excluded.interacted_at,
+        "comment": _interaction_insert.excluded.comment,
+    },
+)
+
+
+@dataclass(frozen=True)
+class JobCounts:
+    """Library counts for a sync job; ``added`` is derived on read instead of stored."""
+
+    start: dict
+    end: dict
+
+    @property
+    def added(self) -> dict:
+        return {key: max(0, self.end[key] - self.start[key]) for key in ("movie_tv", "book", "total")}
+
+    def to_dict(self) -> dict:
+        return {"start": dict(self.start), "end": dict(self.end), "added": self.added}
 
 
 class SyncJobRunner:
     def __init__(self):
         self.settings = get_settings()
-        self.executor = ThreadPoolExecutor(max_workers=2)
-        self._job_counts: Dict[str, dict] = {}
-        self._job_counts_lock = Lock()
+        # One executor per source so a slow source never queues behind another.
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._executors_lock = Lock()
+        # Each job has a single writer (its worker thread) and many status readers. Count
+        # snapshots are replaced wholesale and previews only appended, so plain dict/list
+        # operations are atomic enough under the GIL and no lock is taken.
+        self._job_counts: Dict[str, JobCounts] = {}
+        self._job_previews: Dict[str, Deque[dict]] = {}
 
     def start_sync(
         self,
@@ -38,10 +91,30 @@ class SyncJobRunner:
         if self.settings.sync_inline:
             self._run_sync(job.id, source, username, cookie, force_full, selected_media)
         else:
-            self.executor.submit(self._run_sync, job.id, source, username, cookie, force_full, selected_media)
+            self._executor_for(source).submit(
+                self._run_sync, job.id, source, username, cookie, force_full, selected_media
+            )
 
         return job.id
 
+    def _executor_for(self, source: str) -> ThreadPoolExecutor:
+        with self._executors_lock:
+            executor = self._executors.get(source)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=max(1, self.settings.sync_workers_per_source),
+                    thread_name_prefix=f"sync-{source}",
+                )
+                self._executors[source] = executor
+            return executor
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._executors_lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=wait)
+
     def _run_sync(
         self,
         job_id: str,
@@ -57,84 +130,103 @@ class SyncJobRunner:
 
         try:
             adapter = get_source_adapter(source)
-            with Session(get_engine()) as session:
+            # expire_on_commit=False keeps the job loaded across the per-page commits; this
+            # thread is its only writer, so there is nothing to refresh between pages.
+            with Session(get_engine(), expire_on_commit=False) as session:
                 job = session.get(SyncJob, job_id)
                 if job is None:
                     return
-                start_counts = self._compute_user_counts(session, job.user_id)
+                user_id = job.user_id
+                start_counts = self._compute_user_counts(session, user_id)
                 self._set_job_counts(job_id, start=start_counts, end=start_counts)
                 job.status = "running"
                 job.message = "sync started"
                 session.add(job)
                 session.commit()
 
-            done_pages = 0
-            total_pages = 0
-            media_failures: List[str] = []
-
-            for media_type in media_types:
-                cursor = 0
-                pages_for_type = 0
-                while True:
-                    pages_for_type += 1
-                    if pages_for_type > self.settings.max_history_pages:
-                        break
-
-                    total_pages += 1
-                    self._update_job(job_id, total=total_pages, message=f"syncing {media_type} page {pages_for_type}")
-                    try:
-                        page = adapter.fetch_history(
-                            username=username,
-                            cookie=cookie,
-                            page_cursor=cursor,
-                            media_type=media_type,
-                        )
-                    except Exception as media_exc:
-                        media_failures.append(f"{media_type}: {media_exc}")
-                        self._update_job(job_id, message=f"skip {media_type}: {media_exc}")
-                        break
-
-                    with Session(get_engine()) as session:
-                        job = session.get(SyncJob, job_id)
-                        if job is None:
-                            return
-
-                        for record in page.records:
-                            item = self._upsert_item(session, source=source, record=record)
-                            created = self._upsert_interaction(
+                done_pages = 0
+                total_pages = 0
+                media_failures: List[str] = []
+
+                # Fetch media types concurrently (network-bound) while this thread stays the only
+                # DB writer. Pages are consumed in media_types order so writes stay deterministic.
+                stop_fetching = Event()
+                fetcher = (
+                    ThreadPoolExecutor(max_workers=len(media_types), thread_name_prefix=f"fetch-{source}")
+                    if len(media_types) > 1
+                    else None
+                )
+                try:
+                    page_streams = []
+                    for media_type in media_types:
+                        pages = self._iter_history_pages(adapter, username, cookie, media_type, stop_fetching)
+                        if fetcher is not None:
+                            pages = self._prefetch_pages(fetcher, pages)
+                        page_streams.append((media_type, pages))
+
+                    for media_type, pages in page_streams:
+                        pages_for_type = 0
+                        while True:
+                            try:
+                                page = next(pages, None)
+                            except Exception as media_exc:
+                                total_pages += 1
+                                media_failures.append(f"{media_type}: {media_exc}")
+                                self._update_job_in_session(
+                                    session,
+                                    job,
+                                    total=total_pages,
+                                    message=f"skip {media_type}: {media_exc}",
+                                )
+                                # No commit of its own: this rides along with the next page's
+                                # commit, the final status commit, or the commit before the
+                                # all-failed error below.
+                                break
+                            if page is None:
+                                break
+
+                            pages_for_type += 1
+                            total_pages += 1
+                            created_records = self._upsert_page_records(
                                 session,
-                                user_id=job.user_id,
-                                item_id=item.id,
-                                record=record,
+                                source=source,
+                                user_id=user_id,
+                                records=page.records,
+                                now=datetime.utcnow(),
                             )
-                            if created:
+                            for record in created_records:
                                 self._append_added_preview(job_id, record)
 
-                        session.commit()
-
-                    done_pages += 1
-                    self._update_job(job_id, done=done_pages)
-
-                    if page.next_cursor is None:
-                        break
-                    cursor = page.next_cursor
-
-            if done_pages == 0 and media_failures:
-                raise RuntimeError(f"all media sync failed: {'; '.join(media_failures)}")
-
-            with Session(get_engine()) as session:
-                job = session.get(SyncJob, job_id)
-                if job is None:
-                    return
-                user = session.get(User, job.user_id)
-                end_counts = self._compute_user_counts(session, job.user_id)
+                            done_pages += 1
+                            self._update_job_in_session(
+                                session,
+                                job,
+                                done=done_pages,
+                                total=total_pages,
+                                message=f"syncing {media_type} page {pages_for_type}",
+                            )
+                            # One commit per page covers both the page rows and the job progress.
+                            session.commit()
+                finally:
+                    stop_fetching.set()
+                    if fetcher is not None:
+                        fetcher.shutdown(wait=False)
+
+                if done_pages == 0 and media_failures:
+                    # The failure path uses a fresh session, so persist the staged skip progress first.
+                    session.commit()
+                    raise RuntimeError(f"all media sync failed: {'; '.join(media_failures)}")
+
+                end_counts = self._compute_user_counts(session, user_id)
                 self._set_job_counts(job_id, end=end_counts)
-                if user is not None:
-                    user.last_synced_at = datetime.utcnow()
-                    user.updated_at = datetime.utcnow()
-                    session.add(user)
+                finished_at = datetime.utcnow()
+                session.exec(
+                    update(User)
+                    .where(User.id == user_id)
+                    .values(last_synced_at=finished_at, updated_at=finished_at)
+                )
                 job.status = "done"
-                count_suffix = self._format_counts_suffix(self.get_job_counts(job_id))
+                count_suffix = self._format_counts_suffix(self._job_counts.get(job_id))
                 if media_failures:
                     job.message = (
                         f"sync completed with partial failures: {'; '.join(media_failures)}"
@@ -142,17 +234,18 @@ class SyncJobRunner:
                     )
                 else:
                     job.message = f"sync completed{count_suffix}"
-                job.finished_at = datetime.utcnow()
+                job.finished_at = finished_at
                 session.add(job)
                 session.commit()
         except Exception as exc:
+            # Fresh session: the job session above has been rolled back and closed by now.
             with Session(get_engine()) as session:
                 job = session.get(SyncJob, job_id)
                 if job is None:
                     return
                 end_counts = self._compute_user_counts(session, job.user_id)
                 self._set_job_counts(job_id, end=end_counts)
-                count_suffix = self._format_counts_suffix(self.get_job_counts(job_id))
+                count_suffix = self._format_counts_suffix(self._job_counts.get(job_id))
                 job.status = "failed"
                 job.error_message = str(exc)
                 job.message = f"sync failed: {exc}{count_suffix}"
@@ -160,105 +253,155 @@ class SyncJobRunner:
                 session.add(job)
                 session.commit()
 
-    def _update_job(
+    def _iter_history_pages(
         self,
-        job_id: str,
+        adapter: SourceAdapter,
+        username: str,
+        cookie: Optional[str],
+        media_type: str,
+        stop: Event,
+    ) -> Iterator[HistoryPage]:
+        cursor = 0
+        for _ in range(self.settings.max_history_pages):
+            if stop.is_set():
+                return
+            page = adapter.fetch_history(
+                username=username,
+                cookie=cookie,
+                page_cursor=cursor,
+                media_type=media_type,
+            )
+            yield page
+            if page.next_cursor is None:
+                return
+            cursor = page.next_cursor
+
+    @staticmethod
+    def _prefetch_pages(fetcher: ThreadPoolExecutor, pages: Iterator[HistoryPage]) -> Iterator[HistoryPage]:
+        """Drain ``pages`` on ``fetcher`` and replay them here, re-raising any fetch error in order."""
+        buffer: "Queue[Tuple[Optional[HistoryPage], Optional[Exception]]]" = Queue()
+
+        def _drain() -> None:
+            try:
+                for page in pages:
+                    buffer.put((page, None))
+            except Exception as exc:
+                buffer.put((None, exc))
+                return
+            buffer.put((None, None))
+
+        # Submit now rather than on first next(): the caller builds every stream before consuming
+        # any, which is what lets the media types fetch concurrently.
+        fetcher.submit(_drain)
+
+        def _replay() -> Iterator[HistoryPage]:
+            while True:
+                page, error = buffer.get()
+                if error is not None:
+                    raise error
+                if page is None:
+                    return
+                yield page
+
+        return _replay()
+
+    @staticmethod
+    def _update_job_in_session(
+        session: Session,
+        job: SyncJob,
         done: Optional[int] = None,
         total: Optional[int] = None,
         message: Optional[str] = None,
     ) -> None:
-        with Session(get_engine()) as session:
-            job = session.get(SyncJob, job_id)
-            if job is None:
-                return
-            if done is not None:
-                job.done = done
-            if total is not None:
-                job.total = total
-            if message is not None:
-                job.message = message
-            session.add(job)
-            session.commit()
+        """Stage job progress on the caller's session; the caller decides when to commit."""
+        if done is not None:
+            job.done = done
+        if total is not None:
+            job.total = total
+        if message is not None:
+            job.message = message
+        session.add(job)
 
     def _get_or_create_user(self, session: Session, source: str, username: str) -> User:
-        stmt = select(User).where(User.source == source, User.username == username)
-        user = session.exec(stmt).first()
-        if user is not None:
-            user.updated_at = datetime.utcnow()
-            session.add(user)
-            session.commit()
-            session.refresh(user)
-            return user
-
-        user = User(source=source, username=username)
-        session.add(user)
-        session.commit()
-        session.refresh(user)
-        return user
-
-    def _upsert_item(self, session: Session, source: str, record: HistoryRecord) -> Item:
-        stmt = select(Item).where(Item.source == source, Item.subject_id == record.subject_id)
-        item = session.exec(stmt).first()
-        if item is None:
-            item = Item(
-                source=source,
-                subject_id=record.subject_id,
-                type=record.type,
-                title=record.title,
-                year=record.year,
-                douban_url=record.douban_url,
-                meta_json="{}",
-                updated_at=datetime.utcnow(),
-            )
-            session.add(item)
-            session.flush()
-            return item
-
-        item.type = record.type
-        item.title = record.title
-        item.year = record.year
-        item.douban_url = record.douban_url
-        item.updated_at = datetime.utcnow()
-        session.add(item)
-        session.flush()
-        return item
-
-    def _upsert_interaction(self, session: Session, user_id: int, item_id: int, record: HistoryRecord) -> bool:
-        stmt = select(Interaction).where(Interaction.user_id == user_id, Interaction.item_id == item_id)
-        interaction = session.exec(stmt).first()
-        created = interaction is None
-        if interaction is None:
-            interaction = Interaction(
-                user_id=user_id,
-                item_id=item_id,
-                rating=record.rating,
-                interacted_at=record.interacted_at,
-                comment=record.comment,
-            )
-        else:
-            interaction.rating = record.rating
-            interaction.interacted_at = record.interacted_at
-            interaction.comment = record.comment
-        session.add(interaction)
-        return created
+        # Single upsert: avoids the SELECT-then-INSERT round trip and the race between
+        # two concurrent syncs creating the same user. The caller commits.
+        now = datetime.utcnow()
+        stmt = sqlite_insert(User).values(source=source, username=username, created_at=now, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["source", "username"],
+            set_={"updated_at": stmt.excluded.updated_at},
+        ).returning(User)
+        return session.exec(stmt, execution_options={"populate_existing": True}).scalars().one()
+
+    def _upsert_page_records(
+        self,
+        session: Session,
+        source: str,
+        user_id: int,
+        records: Sequence[HistoryRecord],
+        now: datetime,
+    ) -> List[HistoryRecord]:
+        """Upsert one page of items and interactions stamped with ``now``; return records whose interaction is new."""
+        # A subject repeated within the page keeps its first position and its latest values.
+        latest: Dict[str, HistoryRecord] = {}
+        for record in records:
+            latest[record.subject_id] = record
+        if not latest:
+            return []
+
+        item_rows = session.exec(
+            _ITEM_UPSERT,
+            params=[
+                {
+                    "source": source,
+                    "subject_id": record.subject_id,
+                    "type": record.type,
+                    "title": record.title,
+                    "year": record.year,
+                    "douban_url": record.douban_url,
+                    "meta_json": "{}",
+                    "updated_at": now,
+                }
+                for record in latest.values()
+            ],
+        ).all()
+        item_ids = {subject_id: item_id for item_id, subject_id in item_rows}
+
+        existing_item_ids = self._existing_interaction_item_ids(session, user_id, item_ids.values())
+
+        session.exec(
+            _INTERACTION_UPSERT,
+            params=[
+                {
+                    "user_id": user_id,
+                    "item_id": item_ids[record.subject_id],
+                    "rating": record.rating,
+                    "interacted_at": record.interacted_at,
+                    "comment": record.comment,
+                    "tags_json": "[]",
+                    "created_at": now,
+                }
+                for record in latest.values()
+            ],
+        )
+
+        return [record for record in latest.values() if item_ids[record.subject_id] not in existing_item_ids]
+
+    @staticmethod
+    def _existing_interaction_item_ids(session: Session, user_id: int, item_ids: Iterable[int]) -> Set[int]:
+        """Return which of ``item_ids`` the user already has an interaction for, in one query."""
+        statement = select(Interaction.item_id).where(
+            Interaction.user_id == user_id,
+            Interaction.item_id.in_(list(item_ids)),
+        )
+        return set(session.exec(statement).all())
 
     def get_job_counts(self, job_id: str) -> Optional[dict]:
-        with self._job_counts_lock:
-            summary = self._job_counts.get(job_id)
-            if summary is None:
-                return None
-            return {
-                "start": dict(summary["start"]),
-                "end": dict(summary["end"]),
-                "added": dict(summary["added"]),
-            }
+        counts = self._job_counts.get(job_id)
+        return counts.to_dict() if counts is not None else None
 
     def get_job_added_preview(self, job_id: str) -> List[dict]:
-        with self._job_counts_lock:
-            summary = self._job_counts.get(job_id)
-            if summary is None:
-                return []
-            return list(summary.get("added_preview", []))
+        return list(self._job_previews.get(job_id, ()))
 
     def _set_job_counts(
         self,
@@ -266,73 +409,58 @@ class SyncJobRunner:
         start: Optional[dict] = None,
         end: Optional[dict] = None,
     ) -> None:
-        with self._job_counts_lock:
-            summary = self._job_counts.setdefault(
-                job_id,
-                {
-                    "start": self._empty_count_snapshot(),
-                    "end": self._empty_count_snapshot(),
-                    "added": self._empty_count_snapshot(),
-                    "added_preview": [],
-                },
-            )
-            if start is not None:
-                summary["start"] = dict(start)
-            if end is not None:
-                summary["end"] = dict(end)
-
-            summary["added"] = {
-                "movie_tv": max(0, summary["end"]["movie_tv"] - summary["start"]["movie_tv"]),
-                "book": max(0, summary["end"]["book"] - summary["start"]["book"]),
-                "total": max(0, summary["end"]["total"] - summary["start"]["total"]),
-            }
+        previous = self._job_counts.get(job_id)
+        if previous is None:
+            previous = JobCounts(start=self._empty_count_snapshot(), end=self._empty_count_snapshot())
+        self._job_counts[job_id] = JobCounts(
+            start=start if start is not None else previous.start,
+            end=end if end is not None else previous.end,
+        )
 
     def _append_added_preview(self, job_id: str, record: HistoryRecord) -> None:
-        with self._job_counts_lock:
-            summary = self._job_counts.setdefault(
-                job_id,
-                {
-                    "start": self._empty_count_snapshot(),
-                    "end": self._empty_count_snapshot(),
-                    "added": self._empty_count_snapshot(),
-                    "added_preview": [],
-                },
-            )
-            preview = summary.setdefault("added_preview", [])
-            if len(preview) >= 20:
-                return
-            preview.append(
-                {
-                    "subject_id": record.subject_id,
-                    "title": record.title,
-                    "type": record.type,
-                    "year": record.year,
-                    "douban_url": record.douban_url,
-                }
-            )
+        preview = self._job_previews.get(job_id)
+        if preview is None:
+            preview = self._job_previews.setdefault(job_id, deque(maxlen=_ADDED_PREVIEW_LIMIT))
+        # The preview keeps the first records added, so stop once full rather than
+        # letting the deque rotate older entries out.
+        if len(preview) == _ADDED_PREVIEW_LIMIT:
+            return
+        preview.append(
+            {
+                "subject_id": record.subject_id,
+                "title": record.title,
+                "type": record.type,
+                "year": record.year,
+                "douban_url": record.douban_url,
+            }
+        )
 
     @staticmethod
     def _empty_count_snapshot() -> dict:
         return {"movie_tv": 0, "book": 0, "total": 0}
 
     def _compute_user_counts(self, session: Session, user_id: int) -> dict:
-        statement = select(Item.type).join(Interaction, Interaction.item_id == Item.id).where(Interaction.user_id == user_id)
-        item_types = session.exec(statement).all()
+        statement = (
+            select(Item.type, func.count())
+            .join(Interaction, Interaction.item_id == Item.id)
+            .where(Interaction.user_id == user_id)
+            .group_by(Item.type)
+        )
         movie_tv = 0
         book = 0
-        for item_type in item_types:
-            if item_type in {"movie", "tv"}:
-                movie_tv += 1
+        for item_type, count in session.exec(statement).all():
+            if item_type in _MOVIE_TV_TYPES:
+                movie_tv += count
             elif item_type == "book":
-                book += 1
+                book += count
         return {"movie_tv": movie_tv, "book": book, "total": movie_tv + book}
 
-    def _format_counts_suffix(self, summary: Optional[dict]) -> str:
-        if not summary:
+    def _format_counts_suffix(self, counts: Optional[JobCounts]) -> str:
+        if counts is None:
             return ""
-        start = summary["start"]
-        end = summary["end"]
-        added = summary["added"]
+        start = counts.start
+        end = counts.end
+        added = counts.added
         return (
             " | counts: "
             f"start(movie_tv={start['movie_tv']},book={start['book']},total={start['total']}) "
@@ -342,3 +470,4 @@ class SyncJobRunner:
 
 
 sync_job_runner = SyncJobRunner()
+atexit.register(sync_job_runner.shutdown)
@@ -2,6 +2,7 @@ import os
 import sys
 from pathlib import Path
 
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, SQLModel
@@ -10,8 +11,11 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-TEST_DB_PATH = Path("/tmp/watchwhat-web-test.db")
-TEST_COOKIE_PATH = Path("/tmp/watchwhat-web-cookies-test.json")
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+# pytest-xdist workers each get their own DB and cookie store; a plain run uses the "main" suffix.
+_WORKER_ID = os.environ.get("PYTEST_XDIST_WORKER", "main")
+TEST_DB_PATH = Path(f"/tmp/watchwhat-web-test-{_WORKER_ID}.db")
+TEST_COOKIE_PATH = Path(f"/tmp/watchwhat-web-cookies-test-{_WORKER_ID}.json")
 os.environ["WATCHWHAT_DB_PATH"] = str(TEST_DB_PATH)
 os.environ["WATCHWHAT_SYNC_INLINE"] = "true"
 os.environ["WATCHWHAT_DEEPSEEK_API_KEY"] = ""
@@ -19,40 +23,106 @@ os.environ["WATCHWHAT_PERSIST_COOKIE_ON_DISK"] = "false"
 os.environ["WATCHWHAT_COOKIE_STORE_PATH"] = str(TEST_COOKIE_PATH)
 
 
+def _remove_test_db_files() -> None:
+    for path in (TEST_DB_PATH, Path(str(TEST_DB_PATH) + "-wal"), Path(str(TEST_DB_PATH) + "-shm")):
+        if path.exists():
+            path.unlink()
+
+
 @pytest.fixture(autouse=True)
-def clean_db():
-    if TEST_DB_PATH.exists():
-        TEST_DB_PATH.unlink()
-    wal = Path(str(TEST_DB_PATH) + "-wal")
-    if wal.exists():
-        wal.unlink()
-    shm = Path(str(TEST_DB_PATH) + "-shm")
-    if shm.exists():
-        shm.unlink()
+def clean_cookie_store():
     if TEST_COOKIE_PATH.exists():
         TEST_COOKIE_PATH.unlink()
     yield
 
 
-@pytest.fixture
-def client():
+@pytest.fixture(scope="session")
+def app_client():
+    """Build the app, engine and schema once per run; ``client`` empties the tables per test."""
     from app.config import clear_settings_cache
     from app.db import init_db, reset_engine
     from app.main import app
-    from app.services.cookie_capture import cookie_capture_manager
 
+    _remove_test_db_files()
     clear_settings_cache()
-    engine = reset_engine()
-    SQLModel.metadata.drop_all(engine)
+    reset_engine()
     init_db()
-    cookie_capture_manager.clear_cookie("douban")
     with TestClient(app) as test_client:
         yield test_client
 
 
+@pytest.fixture(scope="session")
+def clear_adapter_cache():
+    """The real ``get_source_adapter.cache_clear``, captured before any fixture patches the getter."""
+    from app.services.adapters import get_source_adapter
+
+    return get_source_adapter.cache_clear
+
+
+@pytest.fixture
+def client(app_client, clear_adapter_cache):
+    from app.db import get_engine
+    from app.services.cookie_capture import cookie_capture_manager
+
+    with get_engine().begin() as connection:
+        for table in reversed(SQLModel.metadata.sorted_tables):
+            connection.execute(table.delete())
+    clear_adapter_cache()
+    cookie_capture_manager.clear_cookie("douban")
+    yield app_client
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def async_client(client):
+    """In-process ASGI client for ``anyio`` tests; skips TestClient's portal thread on every request."""
+    transport = httpx.ASGITransport(app=client.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as test_client:
+        yield test_client
+
+
 @pytest.fixture
 def db_session():
     from app.db import get_engine
 
     with Session(get_engine()) as session:
         yield session
+
+
+@pytest.fixture(scope="session")
+def douban_book_mine_html():
+    return (FIXTURES_DIR / "douban_book_mine_page.html").read_text(encoding="utf-8")
+
+
+_ADAPTER_IMPORT_SITES = ("app.services.adapters", "app.tasks.job_runner", "app.routers.sync")
+
+
+def _route_source_adapter(patcher, adapter):
+    if isinstance(adapter, type):
+        adapter = adapter()
+    for module in _ADAPTER_IMPORT_SITES:
+        patcher.setattr(f"{module}.get_source_adapter", lambda source: adapter)
+    return adapter
+
+
+@pytest.fixture(scope="session")
+def route_source_adapter():
+    """``(patcher, adapter)`` helper for fixtures that patch the adapter with their own MonkeyPatch scope."""
+    return _route_source_adapter
+
+
+@pytest.fixture
+def patch_source_adapter(monkeypatch):
+    """Route every ``get_source_adapter`` import site to one shared fake adapter instance.
+
+    Accepts an adapter instance or a no-argument adapter class, which is instantiated once.
+    """
+
+    def _apply(adapter):
+        return _route_source_adapter(monkeypatch, adapter)
+
+    return _apply
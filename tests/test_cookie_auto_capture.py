@@ -12,14 +12,13 @@ class RecordingAdapter(SourceAdapter):
         return []
 
 
-def test_sync_uses_auto_captured_cookie_when_cookie_missing(client, monkeypatch):
+def test_sync_uses_auto_captured_cookie_when_cookie_missing(client, patch_source_adapter):
     from app.services.cookie_capture import cookie_capture_manager
 
     RecordingAdapter.seen_cookies = []
     cookie_capture_manager.set_cookie("douban", "dbcl2=abc; ck=xyz")
 
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: RecordingAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: RecordingAdapter())
+    patch_source_adapter(RecordingAdapter)
 
     res = client.post(
         "/api/sync",
@@ -70,14 +69,13 @@ def test_cookie_auto_capture_api(client, monkeypatch):
     assert payload["has_cookie"] is True
 
 
-def test_manual_cookie_is_persisted_for_followup_sync(client, monkeypatch):
+def test_manual_cookie_is_persisted_for_followup_sync(client, patch_source_adapter):
     from app.services.cookie_capture import cookie_capture_manager
 
     RecordingAdapter.seen_cookies = []
     cookie_capture_manager.clear_cookie("douban")
 
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: RecordingAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: RecordingAdapter())
+    patch_source_adapter(RecordingAdapter)
 
     first = client.post(
         "/api/sync",
@@ -33,3 +33,23 @@ def test_cookie_persistence_clear_updates_store(tmp_path):
         enable_persistence=True,
     )
     assert reloaded.get_cookie("douban") is None
+
+
+def test_cookie_persistence_skips_unchanged_cookie(tmp_path, monkeypatch):
+    store_path = tmp_path / "cookies.json"
+
+    manager = CookieCaptureManager(
+        persist_path=str(store_path),
+        enable_persistence=True,
+    )
+    writes = []
+    original_persist = manager._persist_cookies
+    monkeypatch.setattr(manager, "_persist_cookies", lambda cookies: writes.append(cookies) or original_persist(cookies))
+
+    manager.set_cookie("douban", "dbcl2=abc123; ck=xyz")
+    manager.set_cookie("douban", " dbcl2=abc123 ; ck=xyz ")
+    manager.set_cookie("douban", "dbcl2=def456; ck=xyz")
+
+    assert len(writes) == 2
+    assert [path.name for path in tmp_path.iterdir()] == ["cookies.json"]
+    assert "dbcl2=def456" in store_path.read_text(encoding="utf-8")
@@ -1,3 +1,4 @@
+import httpx
 import pytest
 
 from app.services.adapters.douban import DoubanAdapter
@@ -68,3 +69,55 @@ def test_fetch_history_404_without_cookie_raises_helpful_error():
         )
 
     assert "Use the username from /people/<username>/" in str(exc.value)
+
+
+class ProfileRedirectClient:
+    def __init__(self, usernames_by_uid, fail_uids=()):
+        self.usernames_by_uid = usernames_by_uid
+        self.fail_uids = set(fail_uids)
+        self.calls = []
+
+    def get(self, url, params=None, headers=None):
+        self.calls.append(url)
+        uid = url.rstrip("/").rsplit("/", 1)[-1]
+        if uid in self.fail_uids:
+            raise RuntimeError("network down")
+        profile_url = f"https://www.douban.com/people/{self.usernames_by_uid[uid]}/"
+        return FakeResponse(200, "<html>profile</html>", url=profile_url)
+
+
+def test_detect_cookie_username_keys_cache_on_dbcl2_uid():
+    client = ProfileRedirectClient({"111": "alice", "222": "bob"})
+    adapter = DoubanAdapter(client=client)
+    shared_prefix = 'bid=same_browser_id; ll="108288"; '
+
+    assert adapter._detect_cookie_username(shared_prefix + 'dbcl2="111:token_a"') == "alice"
+    assert adapter._detect_cookie_username(shared_prefix + 'dbcl2="222:token_b"') == "bob"
+    assert adapter._detect_cookie_username('dbcl2="111:token_c"; ck=zzz') == "alice"
+    assert len(client.calls) == 2
+
+
+def test_detect_cookie_username_does_not_cache_uid_fallback():
+    client = ProfileRedirectClient({"111": "alice"}, fail_uids={"111"})
+    adapter = DoubanAdapter(client=client)
+    cookie = 'dbcl2="111:token"; ck=bbb'
+
+    assert adapter._detect_cookie_username(cookie) == "111"
+    client.fail_uids.clear()
+    assert adapter._detect_cookie_username(cookie) == "alice"
+    assert adapter._detect_cookie_username("ck=bbb") is None
+
+
+def test_default_client_routes_through_env_proxy(monkeypatch):
+    httpcore = pytest.importorskip("httpcore")
+    monkeypatch.setenv("HTTPS_PROXY", "http://proxy.internal:3128")
+    monkeypatch.delenv("NO_PROXY", raising=False)
+    monkeypatch.delenv("no_proxy", raising=False)
+
+    adapter = DoubanAdapter()
+    try:
+        transport = adapter.client._transport_for_url(httpx.URL("https://movie.douban.com/people/demo/collect"))
+        assert isinstance(transport._pool, httpcore.HTTPProxy)
+        assert transport._pool._proxy_url.host == b"proxy.internal"
+    finally:
+        adapter.client.close()
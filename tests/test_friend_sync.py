@@ -1,15 +1,17 @@
+from collections import deque
 from datetime import datetime
 
+import pytest
 from sqlmodel import select
 
-from app.models import User
+from app.models import Interaction, Item, User
 from app.services.adapters.base import CandidateItem, HistoryPage, HistoryRecord, SourceAdapter
 from app.services.adapters.douban import DoubanAdapter
 
 
 class FriendSyncAdapter(SourceAdapter):
-    seen_friend_cookie = []
-    history_calls = []
+    seen_friend_cookie: deque = deque()
+    history_calls: deque = deque()
 
     def fetch_friend_usernames(self, username, cookie, max_count=20):
         FriendSyncAdapter.seen_friend_cookie.append((username, cookie, max_count))
@@ -48,8 +50,8 @@ class FriendSyncAdapter(SourceAdapter):
 
 
 class CookieFallbackFriendAdapter(SourceAdapter):
-    seen_friend_cookie = []
-    history_calls = []
+    seen_friend_cookie: deque = deque()
+    history_calls: deque = deque()
 
     def _detect_cookie_username(self, cookie):
         return "205927986"
@@ -85,6 +87,14 @@ class CookieFallbackFriendAdapter(SourceAdapter):
         return []
 
 
+@pytest.fixture(autouse=True)
+def _reset_adapter_logs():
+    for adapter_cls in (FriendSyncAdapter, CookieFallbackFriendAdapter):
+        adapter_cls.seen_friend_cookie.clear()
+        adapter_cls.history_calls.clear()
+    yield
+
+
 class AntiBotFriendAdapter(SourceAdapter):
     def fetch_friend_usernames(self, username, cookie, max_count=20):
         raise RuntimeError(
@@ -113,16 +123,12 @@ class AntiBotFriendAdapter(SourceAdapter):
         return []
 
 
-def test_friend_sync_endpoint_discovers_and_syncs_friends(client, db_session, monkeypatch):
+def test_friend_sync_endpoint_discovers_and_syncs_friends(client, db_session, patch_source_adapter):
     from app.services.cookie_capture import cookie_capture_manager
 
-    FriendSyncAdapter.seen_friend_cookie = []
-    FriendSyncAdapter.history_calls = []
     cookie_capture_manager.set_cookie("douban", "dbcl2=abc123; ck=xyz")
 
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: FriendSyncAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: FriendSyncAdapter())
-    monkeypatch.setattr("app.routers.sync.get_source_adapter", lambda source: FriendSyncAdapter())
+    patch_source_adapter(FriendSyncAdapter)
 
     # Ensure owner exists in local DB first.
     first = client.post(
@@ -167,22 +173,20 @@ def test_friend_sync_endpoint_discovers_and_syncs_friends(client, db_session, mo
     assert FriendSyncAdapter.seen_friend_cookie[0][1] == "dbcl2=abc123; ck=xyz"
     assert any(call[0] == "friend_a" and call[1] == "dbcl2=abc123; ck=xyz" for call in FriendSyncAdapter.history_calls)
 
-    friend_a = db_session.exec(select(User).where(User.source == "douban", User.username == "friend_a")).first()
-    friend_b = db_session.exec(select(User).where(User.source == "douban", User.username == "friend_b")).first()
-    assert friend_a is not None
-    assert friend_b is not None
+    found = set(
+        db_session.exec(
+            select(User.username).where(User.source == "douban", User.username.in_(["friend_a", "friend_b"]))
+        ).all()
+    )
+    assert {"friend_a", "friend_b"} <= found
 
 
-def test_friend_sync_endpoint_falls_back_to_cookie_identity(client, db_session, monkeypatch):
+def test_friend_sync_endpoint_falls_back_to_cookie_identity(client, db_session, patch_source_adapter):
     from app.services.cookie_capture import cookie_capture_manager
 
-    CookieFallbackFriendAdapter.seen_friend_cookie = []
-    CookieFallbackFriendAdapter.history_calls = []
     cookie_capture_manager.set_cookie("douban", "dbcl2=205927986:token; ck=xyz")
 
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: CookieFallbackFriendAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: CookieFallbackFriendAdapter())
-    monkeypatch.setattr("app.routers.sync.get_source_adapter", lambda source: CookieFallbackFriendAdapter())
+    patch_source_adapter(CookieFallbackFriendAdapter)
 
     response = client.post(
         "/api/friends/sync",
@@ -217,26 +221,38 @@ def test_friend_sync_endpoint_falls_back_to_cookie_identity(client, db_session,
         for call in CookieFallbackFriendAdapter.history_calls
     )
 
-    friend = db_session.exec(select(User).where(User.source == "douban", User.username == "friend_cookie")).first()
-    assert friend is not None
-
-
-def test_friend_sync_endpoint_returns_local_profiles_when_antibot(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: FriendSyncAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: FriendSyncAdapter())
-
-    for username in ("demo_user", "friend_a", "friend_b"):
-        response = client.post(
-            "/api/sync",
-            json={
-                "source": "douban",
-                "username": username,
-                "cookie": None,
-                "force_full": False,
-                "sync_scope": "book",
-            },
+    found = set(
+        db_session.exec(
+            select(User.username).where(User.source == "douban", User.username.in_(["friend_cookie"]))
+        ).all()
+    )
+    assert "friend_cookie" in found
+
+
+def test_friend_sync_endpoint_returns_local_profiles_when_antibot(client, db_session, monkeypatch):
+    # Seed previously synced users directly; local profiles only list users with interactions.
+    usernames = ("demo_user", "friend_a", "friend_b")
+    users = [User(source="douban", username=username) for username in usernames]
+    items = [
+        Item(
+            source="douban",
+            subject_id=f"{username}_book_1",
+            type="book",
+            title=f"{username} Book",
+            year=2020,
+            douban_url=f"https://book.douban.com/subject/{username}_book_1/",
         )
-        assert response.status_code == 200
+        for username in usernames
+    ]
+    db_session.add_all(users + items)
+    db_session.flush()
+    db_session.add_all(
+        [
+            Interaction(user_id=user.id, item_id=item.id, rating=8.0, interacted_at=datetime(2025, 1, 1))
+            for user, item in zip(users, items)
+        ]
+    )
+    db_session.commit()
 
     monkeypatch.setattr("app.routers.sync.get_source_adapter", lambda source: AntiBotFriendAdapter())
 
@@ -268,30 +284,42 @@ class FakeResponse:
         self.url = url
 
 
+_NOT_FOUND = FakeResponse(404, "<html>not found</html>", "https://www.douban.com/404")
+
+_CONTACTS_PAGE_1 = """
+<html><body>
+  <a href="https://www.douban.com/people/friend_1/" title="好友一">friend1</a>
+  <a href="/people/friend_2/" title="好友二">friend2</a>
+  <a href="/people/demo_user/">self</a>
+  <span class="next"><a href="https://www.douban.com/people/demo_user/contacts?start=70">next</a></span>
+</body></html>
+"""
+
+_CONTACTS_PAGE_2 = """
+<html><body>
+  <a href="/people/friend_3/" title="好友三">friend3</a>
+</body></html>
+"""
+
+
+# Keyed by (url, start param); responses are never mutated, so every call shares them.
+_CONTACTS_ROUTES = {
+    ("https://www.douban.com/people/demo_user/contacts", 0): FakeResponse(
+        200, _CONTACTS_PAGE_1, "https://www.douban.com/people/demo_user/contacts"
+    ),
+    ("https://www.douban.com/people/demo_user/contacts", 70): FakeResponse(
+        200, _CONTACTS_PAGE_2, "https://www.douban.com/people/demo_user/contacts?start=70"
+    ),
+}
+
+
+def _route(routes, url, params):
+    return routes.get((url, (params or {}).get("start")), _NOT_FOUND)
+
+
 class ContactsClient:
     def get(self, url, params=None, headers=None):
-        if url == "https://www.douban.com/people/demo_user/contacts" and params and params.get("start") == 70:
-            html = """
-            <html><body>
-              <a href="/people/friend_3/" title="好友三">friend3</a>
-            </body></html>
-            """
-            return FakeResponse(
-                200,
-                html,
-                "https://www.douban.com/people/demo_user/contacts?start=70",
-            )
-        if url == "https://www.douban.com/people/demo_user/contacts":
-            html = """
-            <html><body>
-              <a href="https://www.douban.com/people/friend_1/" title="好友一">friend1</a>
-              <a href="/people/friend_2/" title="好友二">friend2</a>
-              <a href="/people/demo_user/">self</a>
-              <span class="next"><a href="https://www.douban.com/people/demo_user/contacts?start=70">next</a></span>
-            </body></html>
-            """
-            return FakeResponse(200, html, "https://www.douban.com/people/demo_user/contacts")
-        return FakeResponse(404, "<html>not found</html>", "https://www.douban.com/404")
+        return _route(_CONTACTS_ROUTES, url, params)
 
 
 def test_douban_adapter_fetch_friend_usernames_parses_contacts_pages():
@@ -322,13 +350,16 @@ def test_douban_adapter_fetch_friend_profiles_parses_display_name():
     ]
 
 
+_CONTACTS_403 = FakeResponse(
+    403,
+    "<html><title>豆瓣 - 登录跳转页</title></html>",
+    "https://sec.douban.com/b?r=https%3A%2F%2Fwww.douban.com%2Fcontacts%2Flist",
+)
+
+
 class Contacts403Client:
     def get(self, url, params=None, headers=None):
-        return FakeResponse(
-            403,
-            "<html><title>豆瓣 - 登录跳转页</title></html>",
-            "https://sec.douban.com/b?r=https%3A%2F%2Fwww.douban.com%2Fcontacts%2Flist",
-        )
+        return _CONTACTS_403
 
 
 def test_douban_adapter_fetch_friend_usernames_uses_curl_fallback_on_403(monkeypatch):
@@ -345,13 +376,16 @@ def test_douban_adapter_fetch_friend_usernames_uses_curl_fallback_on_403(monkeyp
     assert names == ["friend_10", "friend_20"]
 
 
+_CONTACTS_BLOCKED = FakeResponse(
+    200,
+    "<html><head><title>禁止访问</title></head><body><a href=\"/accounts/login\">登录</a></body></html>",
+    "https://www.douban.com/misc/sorry?original-url=https%3A%2F%2Fwww.douban.com%2Fpeople%2Fdemo_user%2Fcontacts",
+)
+
+
 class ContactsBlockedClient:
     def get(self, url, params=None, headers=None):
-        return FakeResponse(
-            200,
-            "<html><head><title>禁止访问</title></head><body><a href=\"/accounts/login\">登录</a></body></html>",
-            "https://www.douban.com/misc/sorry?original-url=https%3A%2F%2Fwww.douban.com%2Fpeople%2Fdemo_user%2Fcontacts",
-        )
+        return _CONTACTS_BLOCKED
 
 
 def test_douban_adapter_fetch_friend_usernames_reports_antibot_instead_of_login():
@@ -365,26 +399,35 @@ def test_douban_adapter_fetch_friend_usernames_reports_antibot_instead_of_login(
         assert "requires login" not in text
 
 
+_CONTACTS_LIST_PAGE_1 = """
+<html><body>
+  <a href="/people/friend_1/">friend1</a>
+  <a href="/people/friend_2/">friend2</a>
+  <span class="next"><a href="/contacts/list?tag=0&start=20">next</a></span>
+</body></html>
+"""
+
+_CONTACTS_LIST_PAGE_2 = """
+<html><body>
+  <a href="/people/friend_3/">friend3</a>
+  <a href="/people/friend_4/">friend4</a>
+</body></html>
+"""
+
+
+_CONTACTS_LIST_ROUTES = {
+    ("https://www.douban.com/people/demo_user/contacts", 0): FakeResponse(
+        200, _CONTACTS_LIST_PAGE_1, "https://www.douban.com/people/demo_user/contacts"
+    ),
+    ("https://www.douban.com/contacts/list?tag=0&start=20", None): FakeResponse(
+        200, _CONTACTS_LIST_PAGE_2, "https://www.douban.com/contacts/list?tag=0&start=20"
+    ),
+}
+
+
 class ContactsListPaginationClient:
     def get(self, url, params=None, headers=None):
-        if url == "https://www.douban.com/contacts/list?tag=0&start=20":
-            html = """
-            <html><body>
-              <a href="/people/friend_3/">friend3</a>
-              <a href="/people/friend_4/">friend4</a>
-            </body></html>
-            """
-            return FakeResponse(200, html, "https://www.douban.com/contacts/list?tag=0&start=20")
-        if url == "https://www.douban.com/people/demo_user/contacts":
-            html = """
-            <html><body>
-              <a href="/people/friend_1/">friend1</a>
-              <a href="/people/friend_2/">friend2</a>
-              <span class="next"><a href="/contacts/list?tag=0&start=20">next</a></span>
-            </body></html>
-            """
-            return FakeResponse(200, html, "https://www.douban.com/people/demo_user/contacts")
-        return FakeResponse(404, "<html>not found</html>", "https://www.douban.com/404")
+        return _route(_CONTACTS_LIST_ROUTES, url, params)
 
 
 def test_douban_adapter_fetch_friend_usernames_supports_contacts_list_pagination():
@@ -393,13 +436,16 @@ def test_douban_adapter_fetch_friend_usernames_supports_contacts_list_pagination
     assert names == ["friend_1", "friend_2", "friend_3", "friend_4"]
 
 
+_PEOPLE_BLOCKED = FakeResponse(
+    200,
+    "<html><head><title>禁止访问</title></head><body>异常请求</body></html>",
+    "https://www.douban.com/misc/sorry?original-url=https%3A%2F%2Fbook.douban.com%2Fpeople%2Ffriend_a%2Fcollect",
+)
+
+
 class PeopleBlockedClient:
     def get(self, url, params=None, headers=None):
-        return FakeResponse(
-            200,
-            "<html><head><title>禁止访问</title></head><body>异常请求</body></html>",
-            "https://www.douban.com/misc/sorry?original-url=https%3A%2F%2Fbook.douban.com%2Fpeople%2Ffriend_a%2Fcollect",
-        )
+        return _PEOPLE_BLOCKED
 
 
 def test_douban_adapter_fetch_history_uses_curl_fallback_on_antibot(monkeypatch):
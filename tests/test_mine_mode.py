@@ -1,5 +1,3 @@
-from pathlib import Path
-
 from app.services.douban_parser import parse_history_page
 from app.services.douban_username import normalize_douban_username
 
@@ -60,9 +58,8 @@ def test_sync_endpoint_rejects_mine_url_without_cookie(client):
     assert "requires login cookie" in response.json()["detail"]
 
 
-def test_parse_mine_book_page_generic():
-    html = Path("tests/fixtures/douban_book_mine_page.html").read_text(encoding="utf-8")
-    page = parse_history_page(html, media_type="book", current_cursor=0)
+def test_parse_mine_book_page_generic(douban_book_mine_html):
+    page = parse_history_page(douban_book_mine_html, media_type="book", current_cursor=0)
 
     assert len(page.records) == 2
     assert page.records[0].subject_id == "37415823"
@@ -1,318 +1,339 @@
+import sqlite3
+from dataclasses import dataclass
+from functools import cached_property
 from datetime import datetime
+from typing import Dict, FrozenSet, Tuple
 
-from app.services.adapters.base import CandidateItem, HistoryPage, HistoryRecord, SourceAdapter
-
-
-class FakeDoubanAdapter(SourceAdapter):
-    def fetch_history(self, username, cookie, page_cursor, media_type):
-        if page_cursor > 0:
-            return HistoryPage(records=[], next_cursor=None)
-        records = [
-            HistoryRecord(
-                subject_id="seen_movie_1",
-                title="Seen Movie 1",
-                type="movie",
-                year=2020,
-                douban_url="https://movie.douban.com/subject/seen_movie_1/",
-                rating=10.0,
-                interacted_at=datetime(2025, 1, 1),
-            )
-        ]
-        if media_type == "book":
-            records = [
-                HistoryRecord(
-                    subject_id="seen_book_1",
-                    title="Seen Book 1",
-                    type="book",
-                    year=2018,
-                    douban_url="https://book.douban.com/subject/seen_book_1/",
-                    rating=8.0,
-                    interacted_at=datetime(2025, 1, 2),
-                )
-            ]
-        return HistoryPage(records=records, next_cursor=None)
-
-    def fetch_candidate_pool(self, seed_items, cookie=None):
-        return [
-            CandidateItem(
-                subject_id="seen_movie_1",
-                title="Already Seen",
-                type="movie",
-                year=2020,
-                douban_url="https://movie.douban.com/subject/seen_movie_1/",
-                score=0.5,
-            ),
-            CandidateItem(
-                subject_id="new_movie_1",
-                title="Brand New Movie",
-                type="movie",
-                year=2024,
-                douban_url="https://movie.douban.com/subject/new_movie_1/",
-                score=0.95,
-            ),
-            CandidateItem(
-                subject_id="new_book_1",
-                title="Brand New Book",
-                type="book",
-                year=2023,
-                douban_url="https://book.douban.com/subject/new_book_1/",
-                score=0.92,
-            ),
-        ]
-
-
-class EmptyCandidateAdapter(FakeDoubanAdapter):
-    def fetch_candidate_pool(self, seed_items, cookie=None):
-        return []
-
+import pytest
 
-class SeriesNoiseAdapter(FakeDoubanAdapter):
-    def fetch_candidate_pool(self, seed_items, cookie=None):
-        return [
-            CandidateItem(
-                subject_id="op_eng_v1",
-                title="One Piece Vol.1",
-                type="book",
-                year=2005,
-                douban_url="https://book.douban.com/subject/op_eng_v1/",
-                score=0.96,
-            ),
-            CandidateItem(
-                subject_id="op_zh_v2",
-                title="海贼王 第2卷",
-                type="book",
-                year=2006,
-                douban_url="https://book.douban.com/subject/op_zh_v2/",
-                score=0.95,
-            ),
-            CandidateItem(
-                subject_id="op_jp_v3",
-                title="ワンピース 3",
-                type="book",
-                year=2007,
-                douban_url="https://book.douban.com/subject/op_jp_v3/",
-                score=0.94,
-            ),
-            CandidateItem(
-                subject_id="new_book_2",
-                title="三体",
-                type="book",
-                year=2008,
-                douban_url="https://book.douban.com/subject/new_book_2/",
-                score=0.91,
-            ),
-        ]
-
-
-class MysterySeenAdapter(FakeDoubanAdapter):
-    def fetch_history(self, username, cookie, page_cursor, media_type):
-        if page_cursor > 0:
-            return HistoryPage(records=[], next_cursor=None)
-        if media_type == "book":
-            return HistoryPage(
-                records=[
-                    HistoryRecord(
-                        subject_id="seen_mystery_1",
-                        title="嫌疑人X的献身",
-                        type="book",
-                        year=2005,
-                        douban_url="https://book.douban.com/subject/2307791/",
-                        rating=9.0,
-                        interacted_at=datetime(2025, 1, 2),
-                    )
-                ],
-                next_cursor=None,
-            )
-        return HistoryPage(records=[], next_cursor=None)
+from app.db import get_engine
+from app.services.recommendation_engine import FallbackCatalog, override_fallback_catalog
+from app.services.adapters.base import CandidateItem, HistoryPage, HistoryRecord, SourceAdapter
 
-    def fetch_candidate_pool(self, seed_items, cookie=None):
-        return []
+pytestmark = pytest.mark.anyio
+
+_DEMO_USER = "demo_user"
+_FRIEND_A = "friend_a"
+_FRIEND_B = "friend_b"
+_FRIEND_SHARED_BOOK_ID = "friend_shared_book"
+
+
+# eq=False keeps hashing by identity so each dataset can key its DB snapshot.
+@dataclass(frozen=True, eq=False)
+class AdapterData:
+    history: Dict[Tuple[str, str], Tuple[HistoryRecord, ...]]
+    candidates: Tuple[CandidateItem, ...] = ()
+    sync_usernames: Tuple[str, ...] = (_DEMO_USER,)
+
+    @cached_property
+    def seen_subject_ids(self) -> FrozenSet[str]:
+        """Subject ids in the primary user's history, for asserting nothing seen comes back."""
+        primary = self.sync_usernames[0]
+        return frozenset(
+            record.subject_id
+            for (username, _), records in self.history.items()
+            if username == primary
+            for record in records
+        )
 
 
-class CrossLanguageDuplicateAdapter(FakeDoubanAdapter):
-    def fetch_history(self, username, cookie, page_cursor, media_type):
-        if page_cursor > 0:
-            return HistoryPage(records=[], next_cursor=None)
-        if media_type != "book":
-            return HistoryPage(records=[], next_cursor=None)
-        return HistoryPage(
-            records=[
-                HistoryRecord(
-                    subject_id="jp_seen_34717263",
-                    title="そして誰も死ななかった",
-                    type="book",
-                    year=2019,
-                    douban_url="https://book.douban.com/subject/34717263/",
-                    rating=10.0,
-                    interacted_at=datetime(2025, 1, 2),
-                )
-            ],
-            next_cursor=None,
-        )
+_EMPTY_PAGE = HistoryPage(records=[], next_cursor=None)
 
-    def fetch_candidate_pool(self, seed_items, cookie=None):
-        return [
-            CandidateItem(
-                subject_id="zh_alias_36435335",
-                title="无人逝去",
-                type="book",
-                year=2023,
-                douban_url="https://book.douban.com/subject/36435335/",
-                score=0.99,
-            ),
-            CandidateItem(
-                subject_id="book_new_unique_1",
-                title="钟表馆事件",
-                type="book",
-                year=1989,
-                douban_url="https://book.douban.com/subject/book_new_unique_1/",
-                score=0.85,
-            ),
-        ]
-
-
-class FriendCollaborativeAdapter(FakeDoubanAdapter):
-    def fetch_history(self, username, cookie, page_cursor, media_type):
-        if page_cursor > 0:
-            return HistoryPage(records=[], next_cursor=None)
-        if media_type != "book":
-            return HistoryPage(records=[], next_cursor=None)
-        if username == "demo_user":
-            return HistoryPage(
-                records=[
-                    HistoryRecord(
-                        subject_id="seen_book_1",
-                        title="Seen Book 1",
-                        type="book",
-                        year=2018,
-                        douban_url="https://book.douban.com/subject/seen_book_1/",
-                        rating=8.0,
-                        interacted_at=datetime(2025, 1, 2),
-                    )
-                ],
-                next_cursor=None,
-            )
-        if username == "friend_a":
-            return HistoryPage(
-                records=[
-                    HistoryRecord(
-                        subject_id="friend_shared_book",
-                        title="解忧杂货店",
-                        type="book",
-                        year=2012,
-                        douban_url="https://book.douban.com/subject/friend_shared_book/",
-                        rating=9.0,
-                        interacted_at=datetime(2025, 1, 3),
-                    ),
-                    HistoryRecord(
-                        subject_id="friend_only_a_book",
-                        title="白夜行",
-                        type="book",
-                        year=1999,
-                        douban_url="https://book.douban.com/subject/friend_only_a_book/",
-                        rating=8.0,
-                        interacted_at=datetime(2025, 1, 4),
-                    ),
-                ],
-                next_cursor=None,
-            )
-        if username == "friend_b":
-            return HistoryPage(
-                records=[
-                    HistoryRecord(
-                        subject_id="friend_shared_book",
-                        title="解忧杂货店",
-                        type="book",
-                        year=2012,
-                        douban_url="https://book.douban.com/subject/friend_shared_book/",
-                        rating=8.5,
-                        interacted_at=datetime(2025, 1, 5),
-                    )
-                ],
-                next_cursor=None,
-            )
-        return HistoryPage(records=[], next_cursor=None)
 
-    def fetch_candidate_pool(self, seed_items, cookie=None):
-        return []
+class DataDrivenAdapter(SourceAdapter):
+    """Serves history keyed by (username, media_type) on the first page and a fixed candidate pool."""
 
+    def __init__(self, data: AdapterData):
+        self.data = data
+        self.sync_usernames = data.sync_usernames
+        self._pages = {
+            (username, media_type, 0): HistoryPage(records=list(records), next_cursor=None)
+            for (username, media_type), records in data.history.items()
+        }
 
-class WeightedFriendSignalAdapter(FakeDoubanAdapter):
     def fetch_history(self, username, cookie, page_cursor, media_type):
-        if page_cursor > 0:
-            return HistoryPage(records=[], next_cursor=None)
-        if media_type != "book":
-            return HistoryPage(records=[], next_cursor=None)
-        if username == "demo_user":
-            return HistoryPage(
-                records=[
-                    HistoryRecord(
-                        subject_id="seen_book_1",
-                        title="Seen Book 1",
-                        type="book",
-                        year=2018,
-                        douban_url="https://book.douban.com/subject/seen_book_1/",
-                        rating=8.0,
-                        interacted_at=datetime(2025, 1, 2),
-                    )
-                ],
-                next_cursor=None,
-            )
-        if username == "friend_a":
-            return HistoryPage(
-                records=[
-                    HistoryRecord(
-                        subject_id="weighted_book_a",
-                        title="A Book",
-                        type="book",
-                        year=2020,
-                        douban_url="https://book.douban.com/subject/weighted_book_a/",
-                        rating=8.0,
-                        interacted_at=datetime(2025, 1, 1),
-                    )
-                ],
-                next_cursor=None,
-            )
-        if username == "friend_b":
-            return HistoryPage(
-                records=[
-                    HistoryRecord(
-                        subject_id="weighted_book_b",
-                        title="B Book",
-                        type="book",
-                        year=2020,
-                        douban_url="https://book.douban.com/subject/weighted_book_b/",
-                        rating=10.0,
-                        interacted_at=datetime(2025, 1, 1),
-                    )
-                ],
-                next_cursor=None,
-            )
-        return HistoryPage(records=[], next_cursor=None)
+        return self._pages.get((username, media_type, page_cursor), _EMPTY_PAGE)
 
     def fetch_candidate_pool(self, seed_items, cookie=None):
-        return []
-
-
-def _sync_seed_data(client):
-    res = client.post(
-        "/api/sync",
-        json={"source": "douban", "username": "demo_user", "cookie": None, "force_full": False},
-    )
-    assert res.status_code == 200
-
-
-def test_recommend_excludes_seen_items(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: FakeDoubanAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: FakeDoubanAdapter())
-
-    _sync_seed_data(client)
-
-    res = client.post(
+        return list(self.data.candidates)
+
+
+_T1 = datetime(2025, 1, 1)
+_T2 = datetime(2025, 1, 2)
+_T3 = datetime(2025, 1, 3)
+_T4 = datetime(2025, 1, 4)
+_T5 = datetime(2025, 1, 5)
+
+# Records are built once at import; the job runner only reads them.
+_SEEN_MOVIE_1 = HistoryRecord(
+    subject_id="seen_movie_1",
+    title="Seen Movie 1",
+    type="movie",
+    year=2020,
+    douban_url="https://movie.douban.com/subject/seen_movie_1/",
+    rating=10.0,
+    interacted_at=_T1,
+)
+
+_SEEN_BOOK_1 = HistoryRecord(
+    subject_id="seen_book_1",
+    title="Seen Book 1",
+    type="book",
+    year=2018,
+    douban_url="https://book.douban.com/subject/seen_book_1/",
+    rating=8.0,
+    interacted_at=_T2,
+)
+
+_SEEN_MYSTERY_1 = HistoryRecord(
+    subject_id="seen_mystery_1",
+    title="嫌疑人X的献身",
+    type="book",
+    year=2005,
+    douban_url="https://book.douban.com/subject/2307791/",
+    rating=9.0,
+    interacted_at=_T2,
+)
+
+_SEEN_JP_MYSTERY = HistoryRecord(
+    subject_id="jp_seen_34717263",
+    title="そして誰も死ななかった",
+    type="book",
+    year=2019,
+    douban_url="https://book.douban.com/subject/34717263/",
+    rating=10.0,
+    interacted_at=_T2,
+)
+
+_FRIEND_A_SHARED_BOOK = HistoryRecord(
+    subject_id=_FRIEND_SHARED_BOOK_ID,
+    title="解忧杂货店",
+    type="book",
+    year=2012,
+    douban_url="https://book.douban.com/subject/friend_shared_book/",
+    rating=9.0,
+    interacted_at=_T3,
+)
+
+_FRIEND_A_ONLY_BOOK = HistoryRecord(
+    subject_id="friend_only_a_book",
+    title="白夜行",
+    type="book",
+    year=1999,
+    douban_url="https://book.douban.com/subject/friend_only_a_book/",
+    rating=8.0,
+    interacted_at=_T4,
+)
+
+_FRIEND_B_SHARED_BOOK = HistoryRecord(
+    subject_id=_FRIEND_SHARED_BOOK_ID,
+    title="解忧杂货店",
+    type="book",
+    year=2012,
+    douban_url="https://book.douban.com/subject/friend_shared_book/",
+    rating=8.5,
+    interacted_at=_T5,
+)
+
+_WEIGHTED_BOOK_A = HistoryRecord(
+    subject_id="weighted_book_a",
+    title="A Book",
+    type="book",
+    year=2020,
+    douban_url="https://book.douban.com/subject/weighted_book_a/",
+    rating=8.0,
+    interacted_at=_T1,
+)
+
+_WEIGHTED_BOOK_B = HistoryRecord(
+    subject_id="weighted_book_b",
+    title="B Book",
+    type="book",
+    year=2020,
+    douban_url="https://book.douban.com/subject/weighted_book_b/",
+    rating=10.0,
+    interacted_at=_T1,
+)
+
+
+FAKE_DOUBAN = AdapterData(
+    history={
+        (_DEMO_USER, "movie_tv"): (_SEEN_MOVIE_1,),
+        (_DEMO_USER, "book"): (_SEEN_BOOK_1,),
+    },
+    candidates=(
+        CandidateItem(
+            subject_id="seen_movie_1",
+            title="Already Seen",
+            type="movie",
+            year=2020,
+            douban_url="https://movie.douban.com/subject/seen_movie_1/",
+            score=0.5,
+        ),
+        CandidateItem(
+            subject_id="new_movie_1",
+            title="Brand New Movie",
+            type="movie",
+            year=2024,
+            douban_url="https://movie.douban.com/subject/new_movie_1/",
+            score=0.95,
+        ),
+        CandidateItem(
+            subject_id="new_book_1",
+            title="Brand New Book",
+            type="book",
+            year=2023,
+            douban_url="https://book.douban.com/subject/new_book_1/",
+            score=0.92,
+        ),
+    ),
+)
+
+EMPTY_CANDIDATES = AdapterData(history=FAKE_DOUBAN.history)
+
+SERIES_NOISE = AdapterData(
+    history=FAKE_DOUBAN.history,
+    candidates=(
+        CandidateItem(
+            subject_id="op_eng_v1",
+            title="One Piece Vol.1",
+            type="book",
+            year=2005,
+            douban_url="https://book.douban.com/subject/op_eng_v1/",
+            score=0.96,
+        ),
+        CandidateItem(
+            subject_id="op_zh_v2",
+            title="海贼王 第2卷",
+            type="book",
+            year=2006,
+            douban_url="https://book.douban.com/subject/op_zh_v2/",
+            score=0.95,
+        ),
+        CandidateItem(
+            subject_id="op_jp_v3",
+            title="ワンピース 3",
+            type="book",
+            year=2007,
+            douban_url="https://book.douban.com/subject/op_jp_v3/",
+            score=0.94,
+        ),
+        CandidateItem(
+            subject_id="new_book_2",
+            title="三体",
+            type="book",
+            year=2008,
+            douban_url="https://book.douban.com/subject/new_book_2/",
+            score=0.91,
+        ),
+    ),
+)
+
+MYSTERY_SEEN = AdapterData(
+    history={
+        (_DEMO_USER, "book"): (_SEEN_MYSTERY_1,),
+    },
+)
+
+CROSS_LANGUAGE_DUPLICATE = AdapterData(
+    history={
+        (_DEMO_USER, "book"): (_SEEN_JP_MYSTERY,),
+    },
+    candidates=(
+        CandidateItem(
+            subject_id="zh_alias_36435335",
+            title="无人逝去",
+            type="book",
+            year=2023,
+            douban_url="https://book.douban.com/subject/36435335/",
+            score=0.99,
+        ),
+        CandidateItem(
+            subject_id="book_new_unique_1",
+            title="钟表馆事件",
+            type="book",
+            year=1989,
+            douban_url="https://book.douban.com/subject/book_new_unique_1/",
+            score=0.85,
+        ),
+    ),
+)
+
+FRIEND_COLLABORATIVE = AdapterData(
+    history={
+        (_DEMO_USER, "book"): (_SEEN_BOOK_1,),
+        (_FRIEND_A, "book"): (_FRIEND_A_SHARED_BOOK, _FRIEND_A_ONLY_BOOK),
+        (_FRIEND_B, "book"): (_FRIEND_B_SHARED_BOOK,),
+    },
+    sync_usernames=(_DEMO_USER, _FRIEND_A, _FRIEND_B),
+)
+
+WEIGHTED_FRIEND_SIGNAL = AdapterData(
+    history={
+        (_DEMO_USER, "book"): (_SEEN_BOOK_1,),
+        (_FRIEND_A, "book"): (_WEIGHTED_BOOK_A,),
+        (_FRIEND_B, "book"): (_WEIGHTED_BOOK_B,),
+    },
+    sync_usernames=(_DEMO_USER, _FRIEND_A, _FRIEND_B),
+)
+
+
+@pytest.fixture(scope="session")
+def seeded_snapshots():
+    snapshots: Dict[AdapterData, sqlite3.Connection] = {}
+    yield snapshots
+    for snapshot in snapshots.values():
+        snapshot.close()
+
+
+@pytest.fixture
+async def seeded_client(request, async_client, patch_source_adapter, seeded_snapshots):
+    """Client whose DB holds one sync per ``sync_usernames`` of the AdapterData passed via indirect params.
+
+    The first test for a dataset runs the real syncs and snapshots the DB into memory; later tests
+    restore that snapshot with SQLite's backup API instead of syncing again.
+    """
+    data = request.param
+    adapter = patch_source_adapter(DataDrivenAdapter(data))
+    snapshot = seeded_snapshots.get(data)
+    if snapshot is None:
+        res = await async_client.post(
+            "/api/sync/batch",
+            json={"source": "douban", "usernames": list(adapter.sync_usernames), "cookie": None, "force_full": False},
+        )
+        assert res.status_code == 200
+        assert len(res.json()["job_ids"]) == len(adapter.sync_usernames)
+        seeded_snapshots[data] = _snapshot_engine_db()
+    else:
+        _restore_engine_db(snapshot)
+    return async_client
+
+
+def _snapshot_engine_db() -> sqlite3.Connection:
+    snapshot = sqlite3.connect(":memory:", check_same_thread=False)
+    raw = get_engine().raw_connection()
+    try:
+        raw.driver_connection.backup(snapshot)
+    finally:
+        raw.close()
+    return snapshot
+
+
+def _restore_engine_db(snapshot: sqlite3.Connection) -> None:
+    raw = get_engine().raw_connection()
+    try:
+        snapshot.backup(raw.driver_connection)
+    finally:
+        raw.close()
+
+
+@pytest.mark.parametrize("seeded_client", [FAKE_DOUBAN], indirect=True)
+async def test_recommend_excludes_seen_items(seeded_client):
+    res = await seeded_client.post(
         "/api/recommend",
         json={
             "source": "douban",
-            "username": "demo_user",
+            "username": _DEMO_USER,
             "query": "想看轻松高分",
             "top_k": 5,
             "allow_followup": True,
@@ -322,21 +343,18 @@ def test_recommend_excludes_seen_items(client, monkeypatch):
     payload = res.json()
     assert payload["status"] == "ok"
     subject_ids = [x["subject_id"] for x in payload["items"]]
-    assert "seen_movie_1" not in subject_ids
+    assert FAKE_DOUBAN.seen_subject_ids.isdisjoint(subject_ids)
     assert "new_movie_1" in subject_ids
 
 
-def test_followup_flow(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: FakeDoubanAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: FakeDoubanAdapter())
-
-    _sync_seed_data(client)
-
-    first = client.post(
+@pytest.mark.slow
+@pytest.mark.parametrize("seeded_client", [FAKE_DOUBAN], indirect=True)
+async def test_followup_flow(seeded_client):
+    first = await seeded_client.post(
         "/api/recommend",
         json={
             "source": "douban",
-            "username": "demo_user",
+            "username": _DEMO_USER,
             "query": "随便",
             "top_k": 5,
             "allow_followup": True,
@@ -347,7 +365,7 @@ def test_followup_flow(client, monkeypatch):
     assert first_payload["status"] == "need_followup"
     assert first_payload["session_id"]
 
-    followup = client.post(
+    followup = await seeded_client.post(
         "/api/recommend/followup",
         json={"session_id": first_payload["session_id"], "answer": "优先近五年"},
     )
@@ -357,17 +375,13 @@ def test_followup_flow(client, monkeypatch):
     assert len(follow_payload["items"]) >= 1
 
 
-def test_recommend_falls_back_when_external_candidates_empty(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: EmptyCandidateAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: EmptyCandidateAdapter())
-
-    _sync_seed_data(client)
-
-    res = client.post(
+@pytest.mark.parametrize("seeded_client", [EMPTY_CANDIDATES], indirect=True)
+async def test_recommend_falls_back_when_external_candidates_empty(seeded_client):
+    res = await seeded_client.post(
         "/api/recommend",
         json={
             "source": "douban",
-            "username": "demo_user",
+            "username": _DEMO_USER,
             "query": "想看近五年电影",
             "top_k": 5,
             "allow_followup": False,
@@ -380,17 +394,13 @@ def test_recommend_falls_back_when_external_candidates_empty(client, monkeypatch
     assert "候选来源: 本地回退库" in payload["profile_summary"]
 
 
-def test_recommend_strict_book_query_filters_non_book_items(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: FakeDoubanAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: FakeDoubanAdapter())
-
-    _sync_seed_data(client)
-
-    res = client.post(
+@pytest.mark.parametrize("seeded_client", [FAKE_DOUBAN], indirect=True)
+async def test_recommend_strict_book_query_filters_non_book_items(seeded_client):
+    res = await seeded_client.post(
         "/api/recommend",
         json={
             "source": "douban",
-            "username": "demo_user",
+            "username": _DEMO_USER,
             "query": "推荐一些高分小说",
             "top_k": 10,
             "allow_followup": False,
@@ -406,17 +416,13 @@ def test_recommend_strict_book_query_filters_non_book_items(client, monkeypatch)
     assert payload["applied_constraints"]["title_language"] == "zh_preferred"
 
 
-def test_recommend_dedupes_series_and_prefers_chinese_series_title(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: SeriesNoiseAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: SeriesNoiseAdapter())
-
-    _sync_seed_data(client)
-
-    res = client.post(
+@pytest.mark.parametrize("seeded_client", [SERIES_NOISE], indirect=True)
+async def test_recommend_dedupes_series_and_prefers_chinese_series_title(seeded_client):
+    res = await seeded_client.post(
         "/api/recommend",
         json={
             "source": "douban",
-            "username": "demo_user",
+            "username": _DEMO_USER,
             "query": "推荐书籍，偏热血冒险",
             "top_k": 10,
             "allow_followup": False,
@@ -438,17 +444,13 @@ def test_recommend_dedupes_series_and_prefers_chinese_series_title(client, monke
     assert payload["applied_constraints"]["deduped_series_count"] >= 1
 
 
-def test_recommend_filters_cross_language_same_work_if_already_seen(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: CrossLanguageDuplicateAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: CrossLanguageDuplicateAdapter())
-
-    _sync_seed_data(client)
-
-    res = client.post(
+@pytest.mark.parametrize("seeded_client", [CROSS_LANGUAGE_DUPLICATE], indirect=True)
+async def test_recommend_filters_cross_language_same_work_if_already_seen(seeded_client):
+    res = await seeded_client.post(
         "/api/recommend",
         json={
             "source": "douban",
-            "username": "demo_user",
+            "username": _DEMO_USER,
             "query": "推荐推理小说",
             "top_k": 10,
             "allow_followup": False,
@@ -462,131 +464,125 @@ def test_recommend_filters_cross_language_same_work_if_already_seen(client, monk
     assert "zh_alias_36435335" not in subject_ids
 
 
-def test_recommend_book_sparse_candidates_returns_followup_not_cross_type(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: EmptyCandidateAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: EmptyCandidateAdapter())
-    monkeypatch.setattr(
-        "app.services.recommendation_engine.FALLBACK_CANDIDATE_CATALOG",
-        [
-            {
-                "subject_id": "fallback-movie-only",
-                "title": "Only Movie",
-                "type": "movie",
-                "year": 2024,
-                "douban_url": "https://movie.douban.com/subject/fallback-movie-only/",
-                "score": 0.9,
-            }
-        ],
-    )
-
-    _sync_seed_data(client)
-
-    res = client.post(
-        "/api/recommend",
-        json={
-            "source": "douban",
-            "username": "demo_user",
-            "query": "推荐小说",
-            "top_k": 10,
-            "allow_followup": True,
-        },
-    )
+_FALLBACK_MOVIE_ONLY = {
+    "subject_id": "fallback-movie-only",
+    "title": "Only Movie",
+    "type": "movie",
+    "year": 2024,
+    "douban_url": "https://movie.douban.com/subject/fallback-movie-only/",
+    "score": 0.9,
+}
+
+_FALLBACK_MYSTERY_EN = {
+    "subject_id": "fallback-mystery-1",
+    "title": "The Devotion of Suspect X",
+    "display_title_zh": "嫌疑人X的献身",
+    "type": "book",
+    "year": 2005,
+    "douban_url": "https://book.douban.com/subject/2307791/",
+    "score": 0.93,
+    "tags": ["mystery"],
+}
+
+_FALLBACK_SCIFI_EN = {
+    "subject_id": "fallback-scifi-1",
+    "title": "The Three-Body Problem",
+    "display_title_zh": "三体",
+    "type": "book",
+    "year": 2008,
+    "douban_url": "https://book.douban.com/subject/2567698/",
+    "score": 0.91,
+    "tags": ["sci-fi"],
+}
+
+_FALLBACK_MYSTERY_ZH = {**_FALLBACK_MYSTERY_EN, "title": "嫌疑人X的献身"}
+_FALLBACK_SCIFI_ZH = {**_FALLBACK_SCIFI_EN, "title": "三体"}
+
+
+@pytest.mark.parametrize(
+    "seeded_client, catalog_rows, request_fields, expected_status, expected_titles, expected_text",
+    [
+        pytest.param(
+            EMPTY_CANDIDATES,
+            [_FALLBACK_MOVIE_ONLY],
+            {"query": "推荐小说", "top_k": 10, "allow_followup": True},
+            "need_followup",
+            [],
+            ("followup_question", "书籍候选不足"),
+            id="book-sparse-asks-followup-not-cross-type",
+        ),
+        pytest.param(
+            EMPTY_CANDIDATES,
+            [_FALLBACK_MYSTERY_EN, _FALLBACK_SCIFI_EN],
+            {"query": "推荐一些推理小说", "top_k": 5, "allow_followup": False},
+            "ok",
+            ["嫌疑人X的献身"],
+            ("profile_summary", "候选来源: 本地回退库"),
+            id="mystery-filters-by-topic-prefers-chinese-title",
+        ),
+        # The only mystery row is already seen, and the topic must not silently relax to sci-fi.
+        pytest.param(
+            MYSTERY_SEEN,
+            [_FALLBACK_MYSTERY_ZH, _FALLBACK_SCIFI_ZH],
+            {"query": "推荐一些推理小说", "top_k": 20, "allow_followup": False},
+            "ok",
+            [],
+            ("profile_summary", "暂无未读候选"),
+            id="mystery-does-not-auto-relax-topic",
+        ),
+    ],
+    indirect=["seeded_client"],
+)
+async def test_recommend_fallback_catalog(
+    seeded_client, catalog_rows, request_fields, expected_status, expected_titles, expected_text
+):
+    with override_fallback_catalog(catalog_rows):
+        res = await seeded_client.post(
+            "/api/recommend",
+            json={"source": "douban", "username": _DEMO_USER, **request_fields},
+        )
     assert res.status_code == 200
     payload = res.json()
-    assert payload["status"] == "need_followup"
-    assert "书籍候选不足" in payload["followup_question"]
-
-
-def test_recommend_mystery_query_filters_fallback_by_topic_and_prefers_chinese_title(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: EmptyCandidateAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: EmptyCandidateAdapter())
-    monkeypatch.setattr(
-        "app.services.recommendation_engine.FALLBACK_CANDIDATE_CATALOG",
-        [
-            {
-                "subject_id": "fallback-mystery-1",
-                "title": "The Devotion of Suspect X",
-                "display_title_zh": "嫌疑人X的献身",
-                "type": "book",
-                "year": 2005,
-                "douban_url": "https://book.douban.com/subject/2307791/",
-                "score": 0.93,
-                "tags": ["mystery"],
+    assert payload["status"] == expected_status
+    assert [item["title"] for item in payload["items"]] == expected_titles
+    field, substring = expected_text
+    assert substring in payload[field]
+
+
+def test_fallback_catalog_positions_intersect_only_requested_indexes():
+    catalog = FallbackCatalog.from_rows([_FALLBACK_MOVIE_ONLY, _FALLBACK_MYSTERY_EN, _FALLBACK_SCIFI_EN])
+
+    assert catalog.positions(set(), set()) == [0, 1, 2]
+    assert catalog.positions({"book"}, set()) == [1, 2]
+    assert catalog.positions(set(), {"sci-fi", "mystery"}) == [1, 2]
+    assert catalog.positions({"book"}, {"mystery"}) == [1]
+    assert catalog.positions({"movie"}, {"mystery"}) == []
+    assert catalog.positions({"tv"}, set()) == []
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("seeded_client", [EMPTY_CANDIDATES], indirect=True)
+async def test_followup_answer_relaxes_topic_filter_when_user_says_anything(seeded_client):
+    with override_fallback_catalog([_FALLBACK_SCIFI_EN]):
+        first = await seeded_client.post(
+            "/api/recommend",
+            json={
+                "source": "douban",
+                "username": _DEMO_USER,
+                "query": "推荐一些推理小说",
+                "top_k": 20,
+                "allow_followup": True,
             },
-            {
-                "subject_id": "fallback-scifi-1",
-                "title": "The Three-Body Problem",
-                "display_title_zh": "三体",
-                "type": "book",
-                "year": 2008,
-                "douban_url": "https://book.douban.com/subject/2567698/",
-                "score": 0.91,
-                "tags": ["sci-fi"],
-            },
-        ],
-    )
-
-    _sync_seed_data(client)
-
-    res = client.post(
-        "/api/recommend",
-        json={
-            "source": "douban",
-            "username": "demo_user",
-            "query": "推荐一些推理小说",
-            "top_k": 5,
-            "allow_followup": False,
-        },
-    )
-    assert res.status_code == 200
-    payload = res.json()
-    assert payload["status"] == "ok"
-    assert payload["items"]
-    titles = [item["title"] for item in payload["items"]]
-    assert "嫌疑人X的献身" in titles
-    assert "三体" not in titles
-
-
-def test_followup_answer_relaxes_topic_filter_when_user_says_anything(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: EmptyCandidateAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: EmptyCandidateAdapter())
-    monkeypatch.setattr(
-        "app.services.recommendation_engine.FALLBACK_CANDIDATE_CATALOG",
-        [
-            {
-                "subject_id": "fallback-scifi-1",
-                "title": "The Three-Body Problem",
-                "display_title_zh": "三体",
-                "type": "book",
-                "year": 2008,
-                "douban_url": "https://book.douban.com/subject/2567698/",
-                "score": 0.91,
-                "tags": ["sci-fi"],
-            }
-        ],
-    )
-
-    _sync_seed_data(client)
-
-    first = client.post(
-        "/api/recommend",
-        json={
-            "source": "douban",
-            "username": "demo_user",
-            "query": "推荐一些推理小说",
-            "top_k": 20,
-            "allow_followup": True,
-        },
-    )
-    assert first.status_code == 200
-    first_payload = first.json()
-    assert first_payload["status"] == "need_followup"
-    assert first_payload["session_id"]
-
-    second = client.post(
-        "/api/recommend/followup",
-        json={"session_id": first_payload["session_id"], "answer": "都可"},
-    )
+        )
+        assert first.status_code == 200
+        first_payload = first.json()
+        assert first_payload["status"] == "need_followup"
+        assert first_payload["session_id"]
+
+        second = await seeded_client.post(
+            "/api/recommend/followup",
+            json={"session_id": first_payload["session_id"], "answer": "都可"},
+        )
     assert second.status_code == 200
     second_payload = second.json()
     assert second_payload["status"] == "ok"
@@ -594,227 +590,96 @@ def test_followup_answer_relaxes_topic_filter_when_user_says_anything(client, mo
     assert second_payload["items"][0]["title"] == "三体"
 
 
-def test_recommend_does_not_auto_relax_topic_when_user_requested_mystery(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: MysterySeenAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: MysterySeenAdapter())
-    monkeypatch.setattr(
-        "app.services.recommendation_engine.FALLBACK_CANDIDATE_CATALOG",
-        [
-            {
-                "subject_id": "fallback-mystery-1",
-                "title": "嫌疑人X的献身",
-                "display_title_zh": "嫌疑人X的献身",
-                "type": "book",
-                "year": 2005,
-                "douban_url": "https://book.douban.com/subject/2307791/",
-                "score": 0.93,
-                "tags": ["mystery"],
-            },
-            {
-                "subject_id": "fallback-scifi-1",
-                "title": "三体",
-                "display_title_zh": "三体",
-                "type": "book",
-                "year": 2008,
-                "douban_url": "https://book.douban.com/subject/2567698/",
-                "score": 0.91,
-                "tags": ["sci-fi"],
-            },
-        ],
-    )
-
-    _sync_seed_data(client)
-
-    res = client.post(
-        "/api/recommend",
-        json={
-            "source": "douban",
-            "username": "demo_user",
-            "query": "推荐一些推理小说",
-            "top_k": 20,
-            "allow_followup": False,
-        },
-    )
-    assert res.status_code == 200
-    payload = res.json()
-    assert payload["status"] == "ok"
-    assert payload["items"] == []
-    assert "暂无未读候选" in payload["profile_summary"]
-
-
-def test_recommend_uses_friend_high_rating_signal_when_friend_data_available(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: FriendCollaborativeAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: FriendCollaborativeAdapter())
-
-    for username in ("demo_user", "friend_a", "friend_b"):
-        res = client.post(
-            "/api/sync",
-            json={"source": "douban", "username": username, "cookie": None, "force_full": False},
-        )
-        assert res.status_code == 200
-
-    res = client.post(
-        "/api/recommend",
-        json={
-            "source": "douban",
-            "username": "demo_user",
-            "query": "推荐一些书籍",
-            "top_k": 10,
-            "allow_followup": False,
-            "friend_usernames": ["friend_a", "friend_b"],
-        },
-    )
-    assert res.status_code == 200
-    payload = res.json()
-    assert payload["status"] == "ok"
-    assert payload["items"]
-    assert payload["items"][0]["subject_id"] == "friend_shared_book"
-    assert "2位好友高分读过" in payload["items"][0]["reason"]
-
-
-def test_recommend_accepts_friend_profile_urls(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: FriendCollaborativeAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: FriendCollaborativeAdapter())
-
-    for username in ("demo_user", "friend_a", "friend_b"):
-        res = client.post(
-            "/api/sync",
-            json={"source": "douban", "username": username, "cookie": None, "force_full": False},
-        )
-        assert res.status_code == 200
-
-    res = client.post(
-        "/api/recommend",
-        json={
-            "source": "douban",
-            "username": "demo_user",
-            "query": "好友推荐一些书",
-            "top_k": 10,
-            "allow_followup": False,
-            "friend_usernames": [
+@pytest.mark.parametrize(
+    "seeded_client, query, friend_usernames, friend_weights, expected_top, expected_reason",
+    [
+        pytest.param(
+            FRIEND_COLLABORATIVE,
+            "推荐一些书籍",
+            [_FRIEND_A, _FRIEND_B],
+            None,
+            _FRIEND_SHARED_BOOK_ID,
+            "2位好友高分读过",
+            id="friend-high-rating-signal",
+        ),
+        pytest.param(
+            FRIEND_COLLABORATIVE,
+            "好友推荐一些书",
+            [
                 "https://www.douban.com/people/friend_a/",
                 "https://book.douban.com/people/friend_b/collect?start=0",
             ],
-        },
-    )
+            None,
+            _FRIEND_SHARED_BOOK_ID,
+            None,
+            id="friend-profile-urls",
+        ),
+        pytest.param(
+            FRIEND_COLLABORATIVE,
+            "好友推荐一些书",
+            ["FRIEND_A", "Friend_B"],
+            None,
+            _FRIEND_SHARED_BOOK_ID,
+            None,
+            id="friend-usernames-case-insensitive",
+        ),
+        # default weight=1 for both friends, so higher rating book should win.
+        pytest.param(
+            WEIGHTED_FRIEND_SIGNAL,
+            "好友推荐一些书",
+            [_FRIEND_A, _FRIEND_B],
+            None,
+            "weighted_book_b",
+            None,
+            id="friend-weights-default-to-one",
+        ),
+        # boosted weight pushes friend_a's item above higher raw rating from friend_b.
+        pytest.param(
+            WEIGHTED_FRIEND_SIGNAL,
+            "好友推荐一些书",
+            [_FRIEND_A, _FRIEND_B],
+            {_FRIEND_A: 3, _FRIEND_B: 1},
+            "weighted_book_a",
+            "权重",
+            id="friend-weights-override-priority",
+        ),
+    ],
+    indirect=["seeded_client"],
+)
+async def test_recommend_ranks_friend_signal(
+    seeded_client, query, friend_usernames, friend_weights, expected_top, expected_reason
+):
+    request = {
+        "source": "douban",
+        "username": _DEMO_USER,
+        "query": query,
+        "top_k": 10,
+        "allow_followup": False,
+        "friend_usernames": friend_usernames,
+    }
+    if friend_weights is not None:
+        request["friend_weights"] = friend_weights
+    res = await seeded_client.post("/api/recommend", json=request)
     assert res.status_code == 200
     payload = res.json()
     assert payload["status"] == "ok"
     assert payload["items"]
-    assert payload["items"][0]["subject_id"] == "friend_shared_book"
-
+    assert payload["items"][0]["subject_id"] == expected_top
+    if expected_reason is not None:
+        assert expected_reason in payload["items"][0]["reason"]
 
-def test_recommend_friend_usernames_case_insensitive(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: FriendCollaborativeAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: FriendCollaborativeAdapter())
-
-    for username in ("demo_user", "friend_a", "friend_b"):
-        res = client.post(
-            "/api/sync",
-            json={"source": "douban", "username": username, "cookie": None, "force_full": False},
-        )
-        assert res.status_code == 200
-
-    res = client.post(
-        "/api/recommend",
-        json={
-            "source": "douban",
-            "username": "demo_user",
-            "query": "好友推荐一些书",
-            "top_k": 10,
-            "allow_followup": False,
-            "friend_usernames": ["FRIEND_A", "Friend_B"],
-        },
-    )
-    assert res.status_code == 200
-    payload = res.json()
-    assert payload["status"] == "ok"
-    assert payload["items"]
-    assert payload["items"][0]["subject_id"] == "friend_shared_book"
-
-
-def test_recommend_friend_weights_default_to_one(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: WeightedFriendSignalAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: WeightedFriendSignalAdapter())
-
-    for username in ("demo_user", "friend_a", "friend_b"):
-        res = client.post(
-            "/api/sync",
-            json={"source": "douban", "username": username, "cookie": None, "force_full": False},
-        )
-        assert res.status_code == 200
-
-    res = client.post(
-        "/api/recommend",
-        json={
-            "source": "douban",
-            "username": "demo_user",
-            "query": "好友推荐一些书",
-            "top_k": 10,
-            "allow_followup": False,
-            "friend_usernames": ["friend_a", "friend_b"],
-        },
-    )
-    assert res.status_code == 200
-    payload = res.json()
-    assert payload["status"] == "ok"
-    assert payload["items"]
-    # default weight=1 for both friends, so higher rating book should win.
-    assert payload["items"][0]["subject_id"] == "weighted_book_b"
-
-
-def test_recommend_friend_weights_can_override_priority(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: WeightedFriendSignalAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: WeightedFriendSignalAdapter())
-
-    for username in ("demo_user", "friend_a", "friend_b"):
-        res = client.post(
-            "/api/sync",
-            json={"source": "douban", "username": username, "cookie": None, "force_full": False},
-        )
-        assert res.status_code == 200
-
-    res = client.post(
-        "/api/recommend",
-        json={
-            "source": "douban",
-            "username": "demo_user",
-            "query": "好友推荐一些书",
-            "top_k": 10,
-            "allow_followup": False,
-            "friend_usernames": ["friend_a", "friend_b"],
-            "friend_weights": {"friend_a": 3, "friend_b": 1},
-        },
-    )
-    assert res.status_code == 200
-    payload = res.json()
-    assert payload["status"] == "ok"
-    assert payload["items"]
-    # boosted weight pushes friend_a's item above higher raw rating from friend_b.
-    assert payload["items"][0]["subject_id"] == "weighted_book_a"
-    assert "权重" in payload["items"][0]["reason"]
-
-
-def test_recommend_profile_summary_reports_loaded_friend_coverage(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: FriendCollaborativeAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: FriendCollaborativeAdapter())
-
-    for username in ("demo_user", "friend_a", "friend_b"):
-        res = client.post(
-            "/api/sync",
-            json={"source": "douban", "username": username, "cookie": None, "force_full": False},
-        )
-        assert res.status_code == 200
 
-    res = client.post(
+@pytest.mark.parametrize("seeded_client", [FRIEND_COLLABORATIVE], indirect=True)
+async def test_recommend_profile_summary_reports_loaded_friend_coverage(seeded_client):
+    res = await seeded_client.post(
         "/api/recommend",
         json={
             "source": "douban",
-            "username": "demo_user",
+            "username": _DEMO_USER,
             "query": "好友推荐一些书",
             "top_k": 10,
             "allow_followup": False,
-            "friend_usernames": ["friend_a", "friend_b", "friend_missing"],
+            "friend_usernames": [_FRIEND_A, _FRIEND_B, "friend_missing"],
         },
     )
     assert res.status_code == 200
@@ -1,7 +1,10 @@
+import threading
 from datetime import datetime
 
-from sqlmodel import select
+import pytest
+from sqlmodel import Session, select
 
+from app.db import check_sqlite_version, get_engine, reset_engine
 from app.models import Interaction, Item, User
 from app.services.adapters.base import CandidateItem, HistoryPage, HistoryRecord, SourceAdapter
 
@@ -53,10 +56,14 @@ class FakeDoubanAdapter(SourceAdapter):
         ]
 
 
-def test_sync_and_data_persistence(client, db_session, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: FakeDoubanAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: FakeDoubanAdapter())
+@pytest.fixture(scope="module")
+def fake_douban(route_source_adapter):
+    """One FakeDoubanAdapter routed for the whole module; tests needing another adapter patch over it."""
+    with pytest.MonkeyPatch.context() as patcher:
+        yield route_source_adapter(patcher, FakeDoubanAdapter)
 
+
+def test_sync_and_data_persistence(client, db_session, fake_douban):
     res = client.post(
         "/api/sync",
         json={"source": "douban", "username": "demo_user", "cookie": None, "force_full": False},
@@ -85,35 +92,133 @@ def test_sync_and_data_persistence(client, db_session, monkeypatch):
     interactions = db_session.exec(select(Interaction)).all()
     assert len(interactions) == 2
 
-    # Simulate app restart by creating a new client and re-reading persistent DB.
-    with client:
-        pass
-
-    from app.db import get_engine
-    from sqlmodel import Session
-
-    with Session(get_engine()) as new_session:
+    library = client.get(
+        "/api/library",
+        params={"source": "douban", "username": "demo_user", "limit": 10, "offset": 0},
+    )
+    assert library.status_code == 200
+    library_payload = library.json()
+    assert library_payload["total"] == 2
+    assert library_payload["movie_tv_count"] == 1
+    assert library_payload["book_count"] == 1
+    assert len(library_payload["items"]) == 2
+
+    # Simulate app restart: drop the pooled connections, open a fresh engine on the same file and re-read.
+    get_engine().dispose()
+    with Session(reset_engine()) as new_session:
         persisted = new_session.exec(select(User).where(User.username == "demo_user")).first()
         assert persisted is not None
 
 
-def test_library_endpoint_returns_synced_items(client, monkeypatch):
-    monkeypatch.setattr("app.services.adapters.get_source_adapter", lambda source: FakeDoubanAdapter())
-    monkeypatch.setattr("app.tasks.job_runner.get_source_adapter", lambda source: FakeDoubanAdapter())
+def test_resync_updates_rows_without_duplicates(client, db_session, fake_douban):
+    for _ in range(2):
+        res = client.post(
+            "/api/sync",
+            json={"source": "douban", "username": "demo_user", "cookie": None, "force_full": False},
+        )
+        assert res.status_code == 200
+    job_id = res.json()["job_id"]
+
+    payload = client.get(f"/api/sync/{job_id}").json()
+    assert payload["status"] == "done"
+    assert payload["counts"]["start"] == {"movie_tv": 1, "book": 1, "total": 2}
+    assert payload["counts"]["added"] == {"movie_tv": 0, "book": 0, "total": 0}
+    assert payload["added_preview"] == []
+
+    assert len(db_session.exec(select(Item)).all()) == 2
+    assert len(db_session.exec(select(Interaction)).all()) == 2
+
+
+class DuplicateRecordAdapter(FakeDoubanAdapter):
+    def fetch_history(self, username, cookie, page_cursor, media_type):
+        if media_type != "book" or page_cursor > 0:
+            return HistoryPage(records=[], next_cursor=None)
+        record = HistoryRecord(
+            subject_id="b_dup_1",
+            title="Duplicated Book",
+            type="book",
+            year=2021,
+            douban_url="https://book.douban.com/subject/b_dup_1/",
+            rating=6.0,
+            interacted_at=datetime(2025, 1, 2),
+        )
+        updated = HistoryRecord(**{**record.__dict__, "rating": 8.0})
+        return HistoryPage(records=[record, updated], next_cursor=None)
+
+
+def test_sync_collapses_duplicate_records_within_a_page(client, db_session, patch_source_adapter):
+    patch_source_adapter(DuplicateRecordAdapter)
 
     res = client.post(
         "/api/sync",
-        json={"source": "douban", "username": "demo_user", "cookie": None, "force_full": False},
+        json={"source": "douban", "username": "demo_user", "cookie": None, "force_full": False, "sync_scope": "book"},
     )
     assert res.status_code == 200
 
-    library = client.get(
-        "/api/library",
-        params={"source": "douban", "username": "demo_user", "limit": 10, "offset": 0},
+    payload = client.get(f"/api/sync/{res.json()['job_id']}").json()
+    assert [item["subject_id"] for item in payload["added_preview"]] == ["b_dup_1"]
+
+    interactions = db_session.exec(select(Interaction)).all()
+    assert len(interactions) == 1
+    assert interactions[0].rating == 8.0
+
+
+def test_sync_batch_rejects_whole_batch_on_invalid_username(client, db_session, fake_douban):
+    res = client.post(
+        "/api/sync/batch",
+        json={"source": "douban", "usernames": ["demo_user", "https://www.douban.com/"], "sync_scope": "book"},
     )
-    assert library.status_code == 200
-    payload = library.json()
+    assert res.status_code == 400
+    assert db_session.exec(select(User)).all() == []
+
+
+class FailingHistoryAdapter(FakeDoubanAdapter):
+    def fetch_history(self, username, cookie, page_cursor, media_type):
+        raise RuntimeError(f"{media_type} blocked")
+
+
+def test_sync_reports_progress_when_every_media_type_fails(client, patch_source_adapter):
+    patch_source_adapter(FailingHistoryAdapter)
+
+    res = client.post(
+        "/api/sync",
+        json={"source": "douban", "username": "demo_user", "cookie": None, "force_full": False},
+    )
+    assert res.status_code == 200
+
+    payload = client.get(f"/api/sync/{res.json()['job_id']}").json()
+    assert payload["status"] == "failed"
+    assert payload["done"] == 0
     assert payload["total"] == 2
-    assert payload["movie_tv_count"] == 1
-    assert payload["book_count"] == 1
-    assert len(payload["items"]) == 2
+    assert "all media sync failed" in payload["message"]
+
+
+class BarrierAdapter(FakeDoubanAdapter):
+    """Both media types must be inside fetch_history at once for either to get past the barrier."""
+
+    def __init__(self):
+        self.barrier = threading.Barrier(2, timeout=5)
+
+    def fetch_history(self, username, cookie, page_cursor, media_type):
+        self.barrier.wait()
+        return super().fetch_history(username, cookie, page_cursor, media_type)
+
+
+def test_sync_fetches_media_types_concurrently(client, patch_source_adapter):
+    patch_source_adapter(BarrierAdapter)
+
+    res = client.post(
+        "/api/sync",
+        json={"source": "douban", "username": "demo_user", "cookie": None, "force_full": False},
+    )
+    assert res.status_code == 200
+
+    payload = client.get(f"/api/sync/{res.json()['job_id']}").json()
+    assert payload["status"] == "done"
+    assert payload["counts"]["added"] == {"movie_tv": 1, "book": 1, "total": 2}
+
+
+def test_check_sqlite_version_rejects_sqlite_without_upsert_returning():
+    check_sqlite_version((3, 35, 0))
+    with pytest.raises(RuntimeError, match=r"SQLite 3\.35\.0\+ is required \(found 3\.31\.1\)"):
+        check_sqlite_version((3, 31, 1))
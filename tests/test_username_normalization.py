@@ -1,3 +1,5 @@
+import pytest
+
 from app.schemas import RecommendResponse
 from app.services.douban_username import infer_sync_media_types, normalize_douban_username
 
@@ -27,32 +29,54 @@ def test_infer_sync_media_types_for_movie_mine_url():
     assert media_types == ["movie_tv"]
 
 
-def test_sync_endpoint_accepts_douban_url(client, monkeypatch):
+@pytest.fixture
+def captured_start_sync(monkeypatch):
     captured = {}
 
     def fake_start_sync(*, source, username, cookie, force_full, media_types):
-        captured["source"] = source
-        captured["username"] = username
-        captured["cookie"] = cookie
-        captured["force_full"] = force_full
-        captured["media_types"] = media_types
-        return "job-url-1"
+        captured.update(
+            source=source, username=username, cookie=cookie, force_full=force_full, media_types=media_types
+        )
+        return "job-1"
 
     monkeypatch.setattr("app.routers.sync.sync_job_runner.start_sync", fake_start_sync)
-
+    return captured
+
+
+@pytest.mark.parametrize(
+    "payload, expected_username, expected_media_types",
+    [
+        pytest.param(
+            {"username": "https://www.douban.com/people/demo_user/"},
+            "demo_user",
+            ["movie_tv", "book"],
+            id="accepts-douban-url",
+        ),
+        pytest.param(
+            {"username": "my_input_user", "cookie": "dbcl2=abc123; ck=xyz"},
+            "my_input_user",
+            ["movie_tv", "book"],
+            id="preserves-input-username-with-cookie",
+        ),
+        pytest.param(
+            {"username": "demo_user", "sync_scope": "book"},
+            "demo_user",
+            ["book"],
+            id="respects-book-only-scope",
+        ),
+    ],
+)
+def test_sync_endpoint_resolves_username_and_scope(
+    client, captured_start_sync, payload, expected_username, expected_media_types
+):
     response = client.post(
         "/api/sync",
-        json={
-            "source": "douban",
-            "username": "https://www.douban.com/people/demo_user/",
-            "cookie": None,
-            "force_full": False,
-        },
+        json={"source": "douban", "cookie": None, "force_full": False, **payload},
     )
     assert response.status_code == 200
-    assert response.json()["job_id"] == "job-url-1"
-    assert captured["username"] == "demo_user"
-    assert captured["media_types"] == ["movie_tv", "book"]
+    assert response.json()["job_id"] == "job-1"
+    assert captured_start_sync["username"] == expected_username
+    assert captured_start_sync["media_types"] == expected_media_types
 
 
 def test_recommend_endpoint_accepts_douban_url(client, monkeypatch):
@@ -87,56 +111,18 @@ def test_recommend_endpoint_accepts_douban_url(client, monkeypatch):
     assert captured["friend_weights"] == {}
 
 
-def test_sync_endpoint_preserves_user_input_username_with_cookie(client, monkeypatch):
-    captured = {}
+def test_api_responses_use_orjson_when_installed(client, captured_start_sync):
+    orjson = pytest.importorskip("orjson")
+    from fastapi.responses import ORJSONResponse
 
-    def fake_start_sync(*, source, username, cookie, force_full, media_types):
-        captured["source"] = source
-        captured["username"] = username
-        captured["cookie"] = cookie
-        captured["force_full"] = force_full
-        captured["media_types"] = media_types
-        return "job-cookie-1"
+    from app.main import DEFAULT_RESPONSE_CLASS
 
-    monkeypatch.setattr("app.routers.sync.sync_job_runner.start_sync", fake_start_sync)
+    assert DEFAULT_RESPONSE_CLASS is ORJSONResponse
 
     response = client.post(
         "/api/sync",
-        json={
-            "source": "douban",
-            "username": "my_input_user",
-            "cookie": "dbcl2=abc123; ck=xyz",
-            "force_full": False,
-        },
-    )
-    assert response.status_code == 200
-    assert response.json()["job_id"] == "job-cookie-1"
-    assert captured["username"] == "my_input_user"
-
-
-def test_sync_endpoint_respects_book_only_scope(client, monkeypatch):
-    captured = {}
-
-    def fake_start_sync(*, source, username, cookie, force_full, media_types):
-        captured["source"] = source
-        captured["username"] = username
-        captured["cookie"] = cookie
-        captured["force_full"] = force_full
-        captured["media_types"] = media_types
-        return "job-book-only-1"
-
-    monkeypatch.setattr("app.routers.sync.sync_job_runner.start_sync", fake_start_sync)
-
-    response = client.post(
-        "/api/sync",
-        json={
-            "source": "douban",
-            "username": "demo_user",
-            "cookie": None,
-            "force_full": False,
-            "sync_scope": "book",
-        },
+        json={"source": "douban", "username": "demo_user", "cookie": None, "force_full": False},
     )
     assert response.status_code == 200
-    assert response.json()["job_id"] == "job-book-only-1"
-    assert captured["media_types"] == ["book"]
+    assert response.headers["content-type"] == "application/json"
+    assert response.content == orjson.dumps({"job_id": "job-1", "status": "queued"})